@@ -11,6 +11,7 @@ from django.core.cache import cache
 from accounts.models import VerifiedEmail
 from rest_framework_simplejwt.tokens import RefreshToken
 from accounts.tasks import send_otp
+from chat.versions import bump_user_profile
 from rest_framework.parsers import MultiPartParser, FormParser
 import uuid
 logger = logging.getLogger(__name__)
@@ -498,6 +499,8 @@ class MyAccount(APIView):
                     
                     if serializer.is_valid():
                         serializer.save()
+                        # cached member lists / message pages embed the profile
+                        bump_user_profile(user.id)
                         return Response(
                             {
                                 "status": True,
@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from .kafka_utils import producer
+from .kafka_utils import event_producer
 
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -7,4 +7,4 @@ class ChatConfig(AppConfig):
     
     def ready(self):
         import atexit
-        atexit.register(lambda: producer.flush(5))
\ No newline at end of file
+        atexit.register(lambda: event_producer.flush(5))
\ No newline at end of file
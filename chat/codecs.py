@@ -0,0 +1,147 @@
+import io
+import struct
+import datetime
+import msgpack
+import fastavro
+from django.conf import settings
+from chat import fastjson
+
+# wire format of binary events: magic byte, codec id, schema id (big endian), then the payload.
+# legacy events are plain JSON objects and always start with "{", so both can share the topic.
+MAGIC = 0
+HEADER = struct.Struct(">BBH")
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+REALTIME_EVENT_V1 = {
+    "type": "record",
+    "name": "RealtimeEvent",
+    "namespace": "chat.events",
+    "fields": [
+        {"name": "id", "type": "string"},
+        {"name": "sender_id", "type": ["null", "long"], "default": None},
+        {"name": "sender_name", "type": ["null", "string"], "default": None},
+        {"name": "group_id", "type": "string"},
+        {"name": "message", "type": ["null", "string"], "default": None},
+        {"name": "file", "type": ["null", "string"], "default": None},
+        {"name": "message_type", "type": "string", "default": "text"},
+        # microseconds since epoch instead of an ISO string
+        {"name": "timestamp", "type": ["null", "long"], "default": None},
+        {"name": "origin", "type": ["null", "string"], "default": None},
+    ],
+}
+
+
+class SchemaRegistry:
+    """
+    Local stand-in for a schema registry: schemas get a stable numeric id that travels in every event header.
+    Ids are never reused, a new schema version is registered under a new id.
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._latest = {}
+
+    def register(self, schema_id, schema):
+        if schema_id in self._schemas and self._schemas[schema_id]["schema"] != schema:
+            raise ValueError(f"schema id {schema_id} is already registered with another schema")
+        self._schemas[schema_id] = {
+            "schema": schema,
+            "fields": [field["name"] for field in schema["fields"]],
+            "parsed": fastavro.parse_schema(schema),
+        }
+        self._latest[schema["name"]] = schema_id
+        return schema_id
+
+    def get(self, schema_id):
+        try:
+            return self._schemas[schema_id]
+        except KeyError:
+            raise ValueError(f"unknown event schema id {schema_id}")
+
+    def latest(self, name):
+        return self._latest[name]
+
+
+registry = SchemaRegistry()
+registry.register(1, REALTIME_EVENT_V1)
+
+
+def to_record(data, fields):
+    record = {field: data.get(field) for field in fields}
+    timestamp = record.get("timestamp")
+    if isinstance(timestamp, str):
+        delta = datetime.datetime.fromisoformat(timestamp) - EPOCH
+        record["timestamp"] = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    if record.get("sender_id") is not None:
+        record["sender_id"] = int(record["sender_id"])
+    if record.get("id") is not None:
+        record["id"] = str(record["id"])
+    return record
+
+
+def from_record(record):
+    data = dict(record)
+    if isinstance(data.get("timestamp"), int):
+        data["timestamp"] = (EPOCH + datetime.timedelta(microseconds=data["timestamp"])).isoformat()
+    return data
+
+
+class JsonCodec:
+    codec_id = 0
+    name = "json"
+
+    def encode(self, data, schema):
+        return fastjson.dumpb(data)
+
+    def decode(self, payload, schema):
+        return fastjson.loads(payload)
+
+
+class MsgpackCodec:
+    """Positional msgpack: values are packed in schema field order, so keys are not repeated per event."""
+    codec_id = 1
+    name = "msgpack"
+
+    def encode(self, data, schema):
+        record = to_record(data, schema["fields"])
+        return msgpack.packb([record[field] for field in schema["fields"]], use_bin_type=True)
+
+    def decode(self, payload, schema):
+        values = msgpack.unpackb(payload, raw=False)
+        return from_record(dict(zip(schema["fields"], values)))
+
+
+class AvroCodec:
+    codec_id = 2
+    name = "avro"
+
+    def encode(self, data, schema):
+        buffer = io.BytesIO()
+        fastavro.schemaless_writer(buffer, schema["parsed"], to_record(data, schema["fields"]))
+        return buffer.getvalue()
+
+    def decode(self, payload, schema):
+        return from_record(fastavro.schemaless_reader(io.BytesIO(payload), schema["parsed"]))
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), MsgpackCodec(), AvroCodec())}
+CODECS_BY_ID = {codec.codec_id: codec for codec in CODECS.values()}
+
+
+def encode_event(data, codec=None, schema_id=None):
+    codec = CODECS[codec or getattr(settings, "KAFKA_EVENT_CODEC", "json")]
+    if codec.name == "json":
+        # plain JSON stays headerless, exactly what older bridges expect
+        return codec.encode(data, None)
+    schema_id = schema_id or registry.latest("RealtimeEvent")
+    return HEADER.pack(MAGIC, codec.codec_id, schema_id) + codec.encode(data, registry.get(schema_id))
+
+
+def decode_event(value):
+    if value[:1] == b"{":
+        return fastjson.loads(value)
+    magic, codec_id, schema_id = HEADER.unpack_from(value)
+    if magic != MAGIC or codec_id not in CODECS_BY_ID:
+        raise ValueError(f"unknown event encoding (magic={magic}, codec={codec_id})")
+    return CODECS_BY_ID[codec_id].decode(value[HEADER.size:], registry.get(schema_id))
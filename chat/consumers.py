@@ -1,43 +1,69 @@
-import json
 import uuid
+import asyncio
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.exceptions import StopConsumer
 from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from django.utils import timezone
 from django.core.cache import cache
-from cryptography.fernet import Fernet
-from chat.kafka_utils import send_realtime_event
-from chat.utils import is_member
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from chat.kafka_utils import event_producer
+from chat.dedup import message_dedup
+from chat.crypto import encrypt_text, decrypt_many
+from chat.ids import uuid7
+from chat.models import GroupChat
+from chat.frames import build_message_frame, message_data
+from chat.outbound import OutboundQueue
+from chat.presence import presence
+from chat.unread import read_cursors, unread_counters
+from chat.utils import get_member_group, get_member_groups, get_messages_since, save_message, save_messages
+from chat.choices import MESSAGE_TYPE
+from chat import fastjson
 
 logger = logging.getLogger(__name__)
-fernet = Fernet(settings.FERNET_KEY)
+MESSAGE_TYPES = {choice for choice, _ in MESSAGE_TYPE}
+# frame types that are only relayed to live sockets, never stored or sent to kafka
+EPHEMERAL_EVENT_TYPES = {"typing", "uploading"}
+# close code for connections refused because of a malformed request (e.g. an invalid id in ?groups=)
+INVALID_REQUEST_CLOSE_CODE = 4400
+# ack error of a message that was stored but could not be published (producer queue full)
+NOT_DELIVERED = "stored but not delivered live, other members get it when they resync."
+FILE_URL_MAX_LENGTH = GroupChat._meta.get_field("file_message").max_length
+validate_url = URLValidator()
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        self.subscriptions = {}
+        self.outbox = None
+        self.replayed = {}
         try:
             user = self.scope.get("user")
-            self.group_name = self.scope.get("group_id")
+            group_id = self.scope.get("group_id")
 
             # Check if user and group_id were successfully set by the middleware
-            if not user or not self.group_name:
+            if not user or not user.is_authenticated or not group_id:
                 logger.info("Connection attempt without a valid user or group ID.")
                 await self.close(code=4001)  # Use a custom close code
                 return
 
-            if user and await is_member(self.group_name, user):
-                await self.channel_layer.group_add(
-                    self.group_name,
-                    self.channel_name
-                )
+            # resolve sender and group once per connection, receive() reuses them for every frame.
+            self.user = user
+            group = await get_member_group(group_id, user)
+
+            if group is not None:
+                await self.join(group)
 
                 # accept first, then attempt send; protect send with try/except
                 await self.accept()
+                self.start_outbox(f"{user.id}@{group.uid}")
+                await self.mark_online()
                 try:
-                    await self.send(text_data=json.dumps({"message": "connection made."}))
+                    await self.send(text_data=fastjson.dumps({"message": "connection made."}))
+                    # reconnecting clients pass ?since=<last message id they saw>
+                    if self.scope.get("since"):
+                        await self.resume(group, self.scope["since"])
                 except Exception as send_exc:
                     # client disconnected before/while we tried to send; log and stop
                     logger.info(f"Client disconnected during initial send: {send_exc}")
@@ -56,73 +82,93 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.close(code=1011)
             except Exception:
                 logger.debug("Ignored error while closing after connect exception.")
-    
-    async def receive(self, text_data=None):
-        from chat.models import ChatGroup, GroupChat
-        User = get_user_model()
 
+    def start_outbox(self, name):
+        # live events go through a bounded queue, so a slow client can't stall the channel layer
+        self.outbox = OutboundQueue(
+            self.send_frame,
+            self.close_slow,
+            maxsize=settings.CHAT_OUTBOUND_QUEUE_SIZE,
+            policy=settings.CHAT_OUTBOUND_POLICY,
+            name=name,
+        )
+        self.outbox.start()
+
+    async def mark_online(self):
+        # presence is best effort, chat keeps working without it
         try:
-            data = json.loads(text_data)
-            sender_id = data.get("sender")
-            msg_id = data.get("id") or str(uuid.uuid4())
-            group_id = self.group_name
-
-            # Deduplication check (client retries, etc.)
-            cache_key = f"chat_msg_{msg_id}"
-            if cache.get(cache_key):
-                logger.info(f"Duplicate message {msg_id} ignored for group {group_id}")
-                return
-            cache.set(cache_key, True, timeout=60)
+            await presence.connected(self.user.id, self.channel_name, list(self.subscriptions))
+        except Exception as e:
+            logger.error(f"presence update failed for user {self.user.id}: {e}")
 
-            # Verify membership
-            group = await sync_to_async(ChatGroup.objects.get)(
-                uid=uuid.UUID(group_id),
-                group_members__member__id=sender_id
-            )
-            sent_by = await sync_to_async(User.objects.get)(id=sender_id)
+    async def join(self, group):
+        group_name = str(group.uid)
+        self.subscriptions[group_name] = group
+        await self.channel_layer.group_add(group_name, self.channel_name)
 
-            raw_message = data.get("message", "") or ""
-            encrypted_message = (
-                fernet.encrypt(raw_message.encode("utf-8")).decode("utf-8")
-                if raw_message else ""
-            )
+    async def leave(self, group_name):
+        self.subscriptions.pop(group_name, None)
+        await self.channel_layer.group_discard(group_name, self.channel_name)
 
-            message_data = {
-                "id": msg_id,
-                "sender_id": sender_id,
-                "sender_name": getattr(sent_by, "name", getattr(sent_by, "username", "")),
-                "group_id": group_id,
-                "message": encrypted_message,
-                "file": data.get("file_url"),
-                "message_type": data.get("message_type", "text"),
-                "timestamp": timezone.now().isoformat(),
-            }
-
-            # Save to DB
-            await sync_to_async(GroupChat.objects.create)(
-                group=group,
-                sent_by=sent_by,
-                message_type=message_data["message_type"],
-                text_message=encrypted_message,
-                file_message=message_data["file"]
+    async def resume(self, group, message_id):
+        """
+        Streams the messages stored after message_id, then live delivery takes over.
+        The group was joined before the replay query and the consumer handles one event at a time,
+        so live events queue on the channel layer meanwhile; the replayed ids are remembered
+        for a while and their queued live copies are skipped: no gap and no duplicate at the handover.
+        """
+        group_id = str(group.uid)
+        rows, complete = await get_messages_since(group, self.user, message_id, settings.CHAT_RESUME_MAX_MESSAGES)
+        if not complete:
+            # unknown cursor or too far behind: the client reloads through the paginated api
+            await self.send(text_data=fastjson.dumps({"type": "resync", "group_id": group_id}))
+            return
+        # the whole replay is decrypted in one batch, shared with the message list cache
+        plaintexts = await sync_to_async(decrypt_many)([(row.uid, row.text_message) for row in rows if row.text_message])
+        replayed = set()
+        for row in rows:
+            data = message_data(row)
+            data["message"] = plaintexts.get(str(row.uid))
+            await self.send(text_data=build_message_frame(data, decrypted=True))
+            replayed.add(str(row.uid))
+        if replayed:
+            self.replayed[group_id] = replayed
+            asyncio.get_running_loop().call_later(
+                settings.CHAT_RESUME_DEDUP_WINDOW, self.forget_replayed, group_id, replayed
             )
+        await self.send(text_data=fastjson.dumps({"type": "resumed", "group_id": group_id, "count": len(rows)}))
 
-            # Publish only to Kafka (no direct echo here)
-            await sync_to_async(send_realtime_event)(
-                settings.KAFKA_TOPIC,
-                message_data,
-                origin=self.channel_name  # tag sender channel
-            )
+    def forget_replayed(self, group_id, replayed):
+        if self.replayed.get(group_id) is replayed:
+            del self.replayed[group_id]
 
-        except ChatGroup.DoesNotExist:
-            try: 
-                await self.send(text_data=json.dumps(
+    def target_group(self, data):
+        # a single group socket always talks to the group it connected to
+        return next(iter(self.subscriptions.values()), None)
+
+    async def receive(self, text_data=None):
+        try:
+            data = fastjson.loads(text_data)
+            if await self.receive_control(data):
+                return
+
+            # membership is cached on the connection and refreshed by membership_changed events.
+            group = self.target_group(data)
+            if group is None:
+                await self.send(text_data=fastjson.dumps(
                     {"error": "You are not authorised to message in this group."}
                 ))
-            except Exception as send_exc:
-                    # client disconnected before/while we tried to send; log and stop
-                    logger.info(f"Client disconnected during initial send: {send_exc}")
-                    return
+                return
+
+            if data.get("type") in EPHEMERAL_EVENT_TYPES:
+                await self.receive_ephemeral(data, group)
+            elif data.get("type") == "batch":
+                await self.receive_batch(data, group)
+            elif data.get("type") == "read":
+                await self.receive_read(data, group)
+            else:
+                await self.receive_message(data, group)
+
         except StopConsumer:
             try: 
                 await self.close()
@@ -131,52 +177,260 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.exception(f"Error during message receive: {e}")
             try:
-                await self.send(text_data=json.dumps({"error": "Message processing error."}))
+                await self.send(text_data=fastjson.dumps({"error": "Message processing error."}))
             except Exception as send_exc:
                 logger.info(f"Client disconnected during error send: {send_exc}")
                 return
 
+    async def receive_control(self, data):
+        # frames that don't carry messages; returns True when the frame was handled
+        if data.get("type") == "heartbeat":
+            try:
+                await presence.heartbeat(self.user.id, self.channel_name, list(self.subscriptions))
+            except Exception as e:
+                logger.error(f"presence heartbeat failed for user {self.user.id}: {e}")
+            return True
+        return False
+
+    async def receive_ephemeral(self, data, group):
+        """
+        Transient signals such as {"type": "typing", "active": true}.
+        They go straight to the channel layer group: no GroupChat row, no kafka event.
+        Repeats of the same signal are rate limited per user (shared by all of their sockets, in the cache);
+        receivers' outbound queues replace a queued signal of the same sender with the newer one.
+        """
+        group_id = str(group.uid)
+        event_type = data["type"]
+        active = bool(data.get("active", True))
+        limiter_key = f"ephemeral:{event_type}:{group_id}:{self.user.id}"
+        # a state flip (e.g. stopped typing) always goes through, repeats only once per interval
+        if await cache.aget(limiter_key) == active:
+            return
+        await cache.aset(limiter_key, active, settings.CHAT_EPHEMERAL_MIN_INTERVAL)
+
+        await self.channel_layer.group_send(group_id, {
+            "type": "ephemeral_event",
+            "origin": self.channel_name,
+            "coalesce_key": f"{event_type}:{group_id}:{self.user.id}",
+            "frame": fastjson.dumps({
+                "type": event_type,
+                "group_id": group_id,
+                "user_id": self.user.id,
+                "user_name": getattr(self.user, "name", ""),
+                "active": active,
+            }),
+        })
+
+    async def receive_read(self, data, group):
+        """
+        Read cursor, {"type": "read", "message_id": <newest message seen>}.
+        The cursor is buffered and written with the other sockets' cursors in one bulk update.
+        The unread badge is set right away to what is still unread after the cursor (no query when it reached the
+        newest message counted): reading an older message keeps newer ones counted, and a cursor behind the one
+        already read changes nothing.
+        """
+        try:
+            message_id = str(uuid.UUID(str(data.get("message_id"))))
+        except ValueError:
+            await self.send(text_data=fastjson.dumps({"error": "read frame needs a valid message_id."}))
+            return
+        group_id = str(group.uid)
+        cursor = read_cursors.mark(group_id, self.user.id, message_id)
+        try:
+            counts = await unread_counters.read(self.user, group_id, cursor)
+        except Exception as e:
+            logger.error(f"failed to update unread counter of user {self.user.id} in {group_id}: {e}")
+            return
+        if counts is None:
+            # fan-outs kept landing while counting; the next read or the reconcile settles the badge
+            return
+        count, total = counts
+        await self.send(text_data=fastjson.dumps({"type": "unread", "group_id": group_id, "count": count, "total": total}))
+
+    def build_message(self, data, group):
+        """Turns one client message into an unsaved GroupChat row and its realtime event."""
+        sent_by = self.user
+        encrypted_message = encrypt_text(data.get("message", "") or "")
+        row = GroupChat(
+            uid=uuid7(),
+            group=group,
+            sent_by=sent_by,
+            message_type=data.get("message_type", "text"),
+            text_message=encrypted_message,
+            file_message=data.get("file_url")
+        )
+        message_data = {
+            "id": str(row.uid),
+            "sender_id": sent_by.id,
+            "sender_name": getattr(sent_by, "name", getattr(sent_by, "username", "")),
+            "group_id": str(group.uid),
+            "message": encrypted_message,
+            "file": row.file_message,
+            "message_type": row.message_type,
+        }
+        return row, message_data
+
+    def dedup_id(self, client_id):
+        # client ids are only unique per sender
+        return f"{self.user.id}_{client_id}"
+
+    async def receive_message(self, data, group):
+        msg_id = data.get("id") or str(uuid.uuid4())
+        group_id = str(group.uid)
+
+        # Deduplication check (client retries, etc.), one atomic set-if-absent at most.
+        if await message_dedup.ais_duplicate(self.dedup_id(msg_id)):
+            logger.info(f"Duplicate message {msg_id} ignored for group {group_id}")
+            return
+
+        row, message_data = self.build_message(data, group)
+
+        # Save to DB, the group's inbox preview is updated in the same thread hop
+        await sync_to_async(save_message)(row)
+        message_data["timestamp"] = row.created_at.isoformat()
+
+        # Publish only to Kafka (no direct echo here), keyed by group so its order holds.
+        # only waits if the producer queue is full; delivery is reported by the poll thread.
+        try:
+            await event_producer.send(
+                settings.KAFKA_TOPIC,
+                message_data,
+                origin=self.channel_name  # tag sender channel
+            )
+        except BufferError as e:
+            # the row is stored and its id recorded: a retry would be a duplicate, so say what happened instead
+            logger.error(f"message {message_data['id']} stored but not published, producer queue full: {e}")
+            await self.send(text_data=fastjson.dumps({
+                "type": "ack",
+                "group_id": group_id,
+                "ids": {str(msg_id): {"status": "stored", "message_id": message_data["id"], "error": NOT_DELIVERED}},
+            }))
+
+    def validate_message(self, item):
+        # everything build_message and the INSERT rely on, checked before the id is recorded as seen
+        message_type = item.get("message_type", "text")
+        if not isinstance(message_type, str) or message_type not in MESSAGE_TYPES:
+            return "unknown message_type."
+        message, file_url = item.get("message"), item.get("file_url")
+        if message is not None and not isinstance(message, str):
+            return "message must be a string."
+        if file_url is not None:
+            if not isinstance(file_url, str) or len(file_url) > FILE_URL_MAX_LENGTH:
+                return f"file_url must be a url of at most {FILE_URL_MAX_LENGTH} characters."
+            try:
+                validate_url(file_url)
+            except ValidationError:
+                return f"file_url must be a url of at most {FILE_URL_MAX_LENGTH} characters."
+        if not message and not file_url:
+            return "message or file_url required."
+        return None
+
+    def validate_batch_item(self, item):
+        if not isinstance(item, dict) or not item.get("id"):
+            return "every message needs a client id."
+        return self.validate_message(item)
+
+    async def receive_batch(self, data, group):
+        """
+        Batched frame, e.g. a client flushing its offline outbox:
+        {"type": "batch", "messages": [{"id": <client id>, "message": ..., "message_type": ..., "file_url": ...}]}
+        All messages are validated together, saved with one bulk insert, published as one produce batch,
+        and answered with one ack keyed by client id (by "#<index>" for an item without one).
+        If the insert fails every new item is acked "error" and its id is released, so a retry is not a duplicate.
+        Items stored but not queued for kafka (producer queue full) are acked "stored".
+        """
+        items = data.get("messages")
+        if not isinstance(items, list) or not items:
+            await self.send(text_data=fastjson.dumps({"error": "batch frame needs a non-empty messages list."}))
+            return
+        if len(items) > settings.CHAT_MAX_BATCH_MESSAGES:
+            await self.send(text_data=fastjson.dumps(
+                {"error": f"batch frame can carry at most {settings.CHAT_MAX_BATCH_MESSAGES} messages."}
+            ))
+            return
+
+        ack = {}
+        accepted = []
+        for index, item in enumerate(items):
+            error = self.validate_batch_item(item)
+            if error:
+                # items without a usable id are acked by their position in the batch, "#<index>"
+                client_id = item.get("id") if isinstance(item, dict) else None
+                ack[str(client_id) if client_id else f"#{index}"] = {"status": "invalid", "error": error}
+                continue
+            if str(item["id"]) in ack:
+                # repeated inside the same batch, the first copy wins
+                continue
+            ack[str(item["id"])] = None
+            accepted.append(item)
+
+        duplicates = await message_dedup.ais_duplicate_many([self.dedup_id(item["id"]) for item in accepted])
+        # stored: the items behind rows and events, in the same order
+        rows, events, stored = [], [], []
+        for item, duplicate in zip(accepted, duplicates):
+            if duplicate:
+                ack[str(item["id"])] = {"status": "duplicate"}
+                continue
+            row, message_data = self.build_message(item, group)
+            rows.append(row)
+            events.append(message_data)
+            stored.append(item)
+            ack[str(item["id"])] = {"status": "ok", "message_id": message_data["id"]}
+
+        if rows:
+            # one INSERT for the whole batch
+            try:
+                await sync_to_async(save_messages)(rows)
+            except Exception as e:
+                logger.exception(f"failed to store a batch of {len(rows)} messages in {group.uid}: {e}")
+                # nothing was stored: forget the ids so the client's retry is not taken for a duplicate
+                await message_dedup.arelease([self.dedup_id(item["id"]) for item in stored])
+                for item in stored:
+                    ack[str(item["id"])] = {"status": "error", "error": "could not store message, retry."}
+                await self.send(text_data=fastjson.dumps({"type": "ack", "group_id": str(group.uid), "ids": ack}))
+                return
+            for row, message_data in zip(rows, events):
+                message_data["timestamp"] = row.created_at.isoformat()
+            queued = len(await event_producer.send_batch(settings.KAFKA_TOPIC, events, origin=self.channel_name))
+            for item, message_data in zip(stored[queued:], events[queued:]):
+                # stored but never queued for live delivery, the same id must not be retried
+                ack[str(item["id"])] = {"status": "stored", "message_id": message_data["id"], "error": NOT_DELIVERED}
+
+        await self.send(text_data=fastjson.dumps({"type": "ack", "group_id": str(group.uid), "ids": ack}))
+
     async def disconnect(self, close_code):
         logger.info(f"WebSocket disconnected: {close_code}")
+        if self.outbox is not None:
+            await self.outbox.close()
         user = self.scope["user"]
-        if user and user.is_authenticated:
-            cache_key = f"ws_active_{user.id}_{self.group_name}"
-            # Only clear if this channel is the current one
-            if cache.get(cache_key) == self.channel_name:
-                cache.delete(cache_key)
-
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        group_names = list(self.subscriptions)
+        if user and user.is_authenticated and group_names:
+            try:
+                await presence.disconnected(user.id, self.channel_name, group_names)
+            except Exception as e:
+                logger.error(f"presence update failed for user {user.id}: {e}")
+        for group_name in group_names:
+            await self.leave(group_name)
 
     async def send_realtime_data(self, event):
-        logger.info("sending message to WebSocket")
-        data = event["data"]
-
         # Skip if this is the origin socket
-        if data.get("origin") == self.channel_name:
+        if event.get("origin") == self.channel_name:
+            return
+        # already delivered by the resume replay
+        if self.replayed and event.get("id") in self.replayed.get(event.get("group_id"), ()):
             return
 
         try:
-            decrypted_msg = None
-            if data.get("message"):
-                try:
-                    decrypted_msg = fernet.decrypt(data["message"].encode("utf-8")).decode("utf-8")
-                except Exception:
-                    decrypted_msg = data["message"]
-            
-            try: 
-                await self.send(text_data=json.dumps({
-                    "id": data.get("id"),
-                    "type": data.get("message_type", "text"),
-                    "message": decrypted_msg,
-                    "sender_id": data.get("sender_id"),
-                    "sender_name": data.get("sender_name"),
-                    "file": data.get("file"),
-                    "timestamp": data.get("timestamp")
-                }))
-            except Exception as send_exc:
-                    # client disconnected before/while we tried to send; log and stop
-                    logger.info(f"Client disconnected during initial send: {send_exc}")
+            frame = event.get("frame")
+            if frame is None:
+                # events published before frames were pre-built still carry the raw data
+                data = event["data"]
+                if data.get("origin") == self.channel_name:
                     return
+                frame = build_message_frame(data)
+
+            if self.outbox is not None:
+                self.outbox.put(frame, key=event.get("coalesce_key"), group=event.get("group_id"))
         except Exception as e:
             logger.error(f"Failed to send message: {e}")
             try:
@@ -184,6 +438,46 @@ class ChatConsumer(AsyncWebsocketConsumer):
             except Exception:
                     logger.debug("Socket already closed while attempting to close on unauthorized connect.")
 
+    async def ephemeral_event(self, event):
+        if event.get("origin") == self.channel_name or self.outbox is None:
+            return
+        self.outbox.put(event["frame"], key=event.get("coalesce_key"))
+
+    async def presence_changed(self, event):
+        # a newer status of the same member replaces the queued one
+        if self.outbox is not None:
+            self.outbox.put(event["frame"], key=event.get("coalesce_key"))
+
+    async def send_frame(self, frame):
+        await self.send(text_data=frame)
+
+    async def close_slow(self, code):
+        try:
+            await self.close(code=code)
+        except Exception:
+            logger.debug("Socket already closed while shedding slow consumer.")
+
+    async def membership_changed(self, event):
+        # invalidates the cached membership only for the affected users.
+        if self.user.id not in event.get("user_ids", []):
+            return
+        group_name = event.get("group_id") or next(iter(self.subscriptions), None)
+        if group_name not in self.subscriptions:
+            return
+        group = await get_member_group(group_name, self.user)
+        if group is not None:
+            self.subscriptions[group_name] = group
+            return
+        logger.info(f"user {self.user.id} is no longer a member of {group_name}")
+        await self.leave(group_name)
+        await self.on_membership_removed(group_name)
+
+    async def on_membership_removed(self, group_name):
+        try:
+            await self.close(code=4003)
+        except Exception:
+            logger.debug("Socket already closed while attempting to close after membership removal.")
+
     # 🔑 Handle duplicate connection cleanup
     async def force_disconnect(self, event):
         logger.info("Force disconnecting duplicate socket")
@@ -191,3 +485,114 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
         except Exception:
             logger.debug("Socket already closed while attempting to close on unauthorized connect.")
+
+
+class MultiplexChatConsumer(ChatConsumer):
+    """
+    One socket for all of a user's groups (or the subset passed as ?groups=a,b).
+    Every outbound event carries its group_id, inbound message/batch frames name their "group".
+    Control frames:
+    {"type": "subscribe", "groups": [...]} and {"type": "unsubscribe", "groups": [...]}
+    subscribe may carry "since": {<group id>: <last message id seen>} to replay what was missed.
+    """
+
+    async def connect(self):
+        self.subscriptions = {}
+        self.outbox = None
+        self.replayed = {}
+        try:
+            user = self.scope.get("user")
+            if not user or not user.is_authenticated:
+                logger.info("Multiplexed connection attempt without a valid user.")
+                await self.close(code=4001)
+                return
+
+            self.user = user
+            group_ids = self.scope.get("group_ids")
+            if group_ids is not None:
+                try:
+                    group_ids = [uuid.UUID(str(group_id)) for group_id in group_ids]
+                except ValueError:
+                    # a malformed ?groups= is the client's mistake, not a server error
+                    logger.info(f"Multiplexed connection of user {user.id} with an invalid group id.")
+                    await self.close(code=INVALID_REQUEST_CLOSE_CODE)
+                    return
+            groups = await get_member_groups(user, group_ids)
+            await asyncio.gather(*(self.join(group) for group in groups))
+
+            await self.accept()
+            self.start_outbox(f"{user.id}@mux")
+            await self.mark_online()
+            try:
+                await self.send(text_data=fastjson.dumps({
+                    "message": "connection made.",
+                    "groups": list(self.subscriptions),
+                }))
+            except Exception as send_exc:
+                logger.info(f"Client disconnected during initial send: {send_exc}")
+                return
+        except Exception as e:
+            logger.exception(f"Error during multiplexed WebSocket connect:{e}")
+            try:
+                await self.close(code=1011)
+            except Exception:
+                logger.debug("Ignored error while closing after connect exception.")
+
+    def target_group(self, data):
+        try:
+            return self.subscriptions.get(str(uuid.UUID(str(data.get("group")))))
+        except ValueError:
+            return None
+
+    async def receive_control(self, data):
+        frame_type = data.get("type")
+        if frame_type not in ("subscribe", "unsubscribe"):
+            return await super().receive_control(data)
+
+        requested = data.get("groups") or []
+        if not isinstance(requested, list):
+            requested = [requested]
+        try:
+            requested = [str(uuid.UUID(str(group_id))) for group_id in requested]
+        except ValueError:
+            await self.send(text_data=fastjson.dumps({"error": "invalid group id."}))
+            return True
+
+        if frame_type == "subscribe":
+            new_ids = [group_id for group_id in requested if group_id not in self.subscriptions]
+            groups = await get_member_groups(self.user, new_ids) if new_ids else []
+            await asyncio.gather(*(self.join(group) for group in groups))
+            if groups:
+                await self.update_presence(joined=[str(group.uid) for group in groups])
+            await self.send(text_data=fastjson.dumps({
+                "type": "subscribed",
+                "groups": [group_id for group_id in requested if group_id in self.subscriptions],
+                "rejected": [group_id for group_id in requested if group_id not in self.subscriptions],
+            }))
+            since = data.get("since") if isinstance(data.get("since"), dict) else {}
+            for group in groups:
+                if since.get(str(group.uid)):
+                    await self.resume(group, since[str(group.uid)])
+        else:
+            left = [group_id for group_id in requested if group_id in self.subscriptions]
+            await asyncio.gather(*(self.leave(group_id) for group_id in left))
+            if left:
+                await self.update_presence(left=left)
+            await self.send(text_data=fastjson.dumps({"type": "unsubscribed", "groups": left}))
+        return True
+
+    async def update_presence(self, joined=(), left=()):
+        # group presence follows subscriptions right away instead of at the next heartbeat or the ttl
+        try:
+            if joined:
+                await presence.heartbeat(self.user.id, self.channel_name, list(joined))
+            if left:
+                await presence.left_groups(self.user.id, list(left))
+        except Exception as e:
+            logger.error(f"presence update failed for user {self.user.id}: {e}")
+
+    async def on_membership_removed(self, group_name):
+        # only this group is dropped, the socket stays open for the others
+        await self.update_presence(left=[group_name])
+        if self.outbox is not None:
+            self.outbox.put(fastjson.dumps({"type": "unsubscribed", "groups": [group_name], "reason": "removed"}))
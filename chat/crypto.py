@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet
+from django.conf import settings
+
+fernet = Fernet(settings.FERNET_KEY)
+
+
+def encrypt_text(text):
+    if not text:
+        return ""
+    return fernet.encrypt(text.encode("utf-8")).decode("utf-8")
+
+
+def decrypt_text(token):
+    """Decrypt a stored message, falling back to the raw value for unencrypted/corrupted rows."""
+    if not token:
+        return None
+    try:
+        return fernet.decrypt(token.encode("utf-8")).decode("utf-8")
+    except Exception:
+        return token
+
+
+class DecryptedCache:
+    """
+    Bounded LRU of decrypted message text keyed by message uid.
+    Plaintext only ever lives in this process's memory, it is never written to redis or disk;
+    CHAT_DECRYPT_CACHE_SIZE = 0 turns caching off.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._items:
+                    self._items.move_to_end(key)
+                    found[key] = self._items[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._items[key] = value
+                self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        return {"size": len(self._items), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+decrypted_cache = DecryptedCache(settings.CHAT_DECRYPT_CACHE_SIZE)
+_executor = None
+
+
+def _decrypt_chunk(tokens):
+    return [decrypt_text(token) for token in tokens]
+
+
+def decrypt_many(items, cache=True):
+    """
+    Decrypt a page of messages at once, items are (uid, token) pairs; returns {uid: text}.
+    Cached uids are served from the LRU, the rest is split into one chunk per worker of a shared pool
+    (small pages are decrypted inline, handing them to threads costs more than it saves).
+    """
+    global _executor
+    keys = [str(uid) for uid, _ in items]
+    found = decrypted_cache.get_many(keys) if cache else {}
+    missing = [(key, token) for key, (_, token) in zip(keys, items) if key not in found]
+    if not missing:
+        return found
+
+    workers = settings.CHAT_DECRYPT_WORKERS
+    tokens = [token for _, token in missing]
+    if workers > 1 and len(tokens) >= settings.CHAT_DECRYPT_PARALLEL_MIN:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-decrypt")
+        size = -(-len(tokens) // workers)
+        texts = [text for chunk in _executor.map(_decrypt_chunk, [tokens[i:i + size] for i in range(0, len(tokens), size)]) for text in chunk]
+    else:
+        texts = _decrypt_chunk(tokens)
+
+    decrypted = {key: text for (key, _), text in zip(missing, texts)}
+    if cache:
+        decrypted_cache.set_many(decrypted)
+    found.update(decrypted)
+    return found
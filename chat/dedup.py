@@ -0,0 +1,124 @@
+import time
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+
+
+class MessageDeduplicator:
+    """
+    Two tier deduplication of client message ids.
+    - tier 1: bounded in-process LRU of recently seen ids, costs no network at all.
+    - tier 2: a single atomic cache.add (SET NX on redis) shared by every worker.
+    """
+
+    def __init__(self, prefix="chat_msg", ttl=60, local_size=10000):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_size = local_size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _key(self, msg_id):
+        return f"{self.prefix}_{msg_id}"
+
+    def _seen_locally(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._seen.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < now:
+                del self._seen[key]
+                return False
+            self._seen.move_to_end(key)
+            self.local_hits += 1
+            return True
+
+    def _remember(self, key):
+        with self._lock:
+            self._seen[key] = time.monotonic() + self.ttl
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.local_size:
+                self._seen.popitem(last=False)
+
+    def _record_shared(self, key, added):
+        # remember the id either way, so retries of it never reach redis again.
+        self._remember(key)
+        with self._lock:
+            if added:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+        return not added
+
+    def is_duplicate(self, msg_id):
+        key = self._key(msg_id)
+        if self._seen_locally(key):
+            return True
+        return self._record_shared(key, cache.add(key, True, timeout=self.ttl))
+
+    async def ais_duplicate(self, msg_id):
+        key = self._key(msg_id)
+        if self._seen_locally(key):
+            return True
+        return self._record_shared(key, await cache.aadd(key, True, timeout=self.ttl))
+
+    def is_duplicate_many(self, msg_ids):
+        """Same as is_duplicate for a batch of ids, with one pipelined round trip on redis."""
+        results = [None] * len(msg_ids)
+        pending = []
+        for index, msg_id in enumerate(msg_ids):
+            key = self._key(msg_id)
+            if self._seen_locally(key):
+                results[index] = True
+            else:
+                pending.append((index, key))
+
+        get_client = getattr(getattr(cache, "_cache", None), "get_client", None)
+        if pending and get_client is not None:
+            # django's RedisCache: SET NX for every key in one pipeline
+            client = get_client(write=True)
+            pipeline = client.pipeline(transaction=False)
+            for _, key in pending:
+                pipeline.set(cache.make_and_validate_key(key), 1, nx=True, ex=self.ttl)
+            added = pipeline.execute()
+        else:
+            added = [cache.add(key, True, timeout=self.ttl) for _, key in pending]
+
+        for (index, key), was_added in zip(pending, added):
+            results[index] = self._record_shared(key, bool(was_added))
+        return results
+
+    async def ais_duplicate_many(self, msg_ids):
+        return await sync_to_async(self.is_duplicate_many)(msg_ids)
+
+    def release(self, msg_ids):
+        """Forget ids whose message could not be stored, so the client's retry goes through."""
+        keys = [self._key(msg_id) for msg_id in msg_ids]
+        with self._lock:
+            for key in keys:
+                self._seen.pop(key, None)
+        cache.delete_many(keys)
+
+    async def arelease(self, msg_ids):
+        await sync_to_async(self.release)(msg_ids)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "local_size": len(self._seen),
+            }
+
+
+message_dedup = MessageDeduplicator(
+    ttl=getattr(settings, "CHAT_DEDUP_TTL", 60),
+    local_size=getattr(settings, "CHAT_DEDUP_LOCAL_SIZE", 10000),
+)
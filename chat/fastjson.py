@@ -0,0 +1,48 @@
+"""
+One JSON layer for the REST renderer/parser, websocket frames and the kafka JSON codec.
+Uses orjson when it is installed, the stdlib json module otherwise; both produce compact UTF-8 JSON
+and both encode UUIDs, datetimes (UTC as "Z", like DRF) and DRF leftovers such as lazy strings.
+"""
+import json
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    # everything orjson has no native encoding for (Decimal, lazy strings, querysets, ...) the way DRF encodes it
+    return _encoder.default(value)
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+    _OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumpb(data):
+        return orjson.dumps(data, default=_default, option=_OPTIONS)
+
+    def dumps(data):
+        return orjson.dumps(data, default=_default, option=_OPTIONS).decode("utf-8")
+
+    def loads(data):
+        return orjson.loads(data)
+
+    DecodeError = orjson.JSONDecodeError
+else:
+    BACKEND = "json"
+
+    def dumps(data):
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+
+    def dumpb(data):
+        return dumps(data).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+    DecodeError = json.JSONDecodeError
@@ -0,0 +1,48 @@
+from chat.crypto import decrypt_text
+from chat import fastjson
+
+
+def build_message_frame(data, decrypted=False):
+    """
+    Build the outbound websocket text for a realtime message event.
+    Called once per message by the kafka bridge, every socket of the group
+    then writes the same pre-encoded text instead of decrypting it again.
+    decrypted=True means data["message"] is already plaintext (e.g. from decrypt_many).
+    """
+    return fastjson.dumps({
+        "id": data.get("id"),
+        # lets multiplexed sockets tell groups apart
+        "group_id": data.get("group_id"),
+        "type": data.get("message_type", "text"),
+        "message": data.get("message") if decrypted else decrypt_text(data.get("message")),
+        "sender_id": data.get("sender_id"),
+        "sender_name": data.get("sender_name"),
+        "file": data.get("file"),
+        "timestamp": data.get("timestamp")
+    })
+
+
+def realtime_event(data):
+    # channel layer event carrying the pre-encoded frame plus the origin socket to skip,
+    # id and group_id let a resuming socket drop messages it already got from the replay.
+    return {
+        "type": "send_realtime_data",
+        "frame": build_message_frame(data),
+        "origin": data.get("origin"),
+        "id": data.get("id"),
+        "group_id": data.get("group_id"),
+    }
+
+
+def message_data(row):
+    """Realtime event data of a stored GroupChat row, the same shape the consumer publishes to kafka."""
+    return {
+        "id": str(row.uid),
+        "sender_id": row.sent_by_id,
+        "sender_name": getattr(row.sent_by, "name", "") if row.sent_by_id else "",
+        "group_id": str(row.group_id),
+        "message": row.text_message,
+        "file": row.file_message,
+        "message_type": row.message_type,
+        "timestamp": row.created_at.isoformat(),
+    }
@@ -0,0 +1,63 @@
+import os
+import time
+import uuid
+import datetime
+import threading
+
+# uuid7 (RFC 9562): 48 bit unix ms timestamp, version, 12 bit counter, variant, 62 random bits.
+# ids sort by creation time, so new rows append to the right edge of the primary key index
+# instead of landing on a random page like uuid4.
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+COUNTER_MAX = 0xFFF
+
+
+def _build(ms, counter, tail):
+    value = (ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= (counter & COUNTER_MAX) << 64
+    value |= 0b10 << 62
+    value |= tail & 0x3FFFFFFFFFFFFFFF
+    return uuid.UUID(int=value)
+
+
+def uuid7():
+    """
+    Time ordered uuid. Inside one millisecond the 12 bit counter keeps ids of this process
+    strictly increasing; it starts at a random low value so processes don't collide on it.
+    """
+    global _last_ms, _counter
+    tail = int.from_bytes(os.urandom(8), "big")
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x1FF
+        else:
+            # same millisecond (or the clock stepped back): keep counting on the last timestamp
+            _counter += 1
+            if _counter > COUNTER_MAX:
+                _last_ms += 1
+                _counter = 0
+        return _build(_last_ms, _counter, tail)
+
+
+def uuid7_from_datetime(value, random=True):
+    """
+    uuid7 for a given moment, e.g. to rekey rows from their created_at.
+    With random=False it is the smallest id of that millisecond, usable as a range bound.
+    """
+    ms = int(value.timestamp() * 1000)
+    if not random:
+        return _build(ms, 0, 0)
+    return _build(ms, int.from_bytes(os.urandom(2), "big") & COUNTER_MAX, int.from_bytes(os.urandom(8), "big"))
+
+
+def uuid7_datetime(value):
+    """Creation time encoded in a uuid7, None for other versions."""
+    value = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    if value.version != 7:
+        return None
+    return datetime.datetime.fromtimestamp((value.int >> 80) / 1000, tz=datetime.timezone.utc)
@@ -0,0 +1,255 @@
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from confluent_kafka import Consumer, KafkaError, TopicPartition
+from django.conf import settings
+from chat.codecs import decode_event
+from chat.frames import realtime_event
+
+logger = logging.getLogger(__name__)
+
+
+def build_consumer(client_id="chat-bridge"):
+    conf = {
+        "bootstrap.servers": settings.KAFKA_BROKER_URL,
+        "group.id": settings.KAFKA_CONSUMER_GROUP,
+        "client.id": client_id,
+        "enable.auto.commit": False,  # <- offsets are committed by the bridge after delivery
+        "auto.offset.reset": "latest",
+        # incremental rebalances only move the partitions that change owner
+        "partition.assignment.strategy": "cooperative-sticky",
+    }
+    return Consumer(**conf)
+
+
+class KafkaChannelsBridge:
+    """
+    Moves realtime events from kafka to the channel layer.
+    - consumes in batches, polling happens on a worker thread so the event loop stays free.
+    - group_send runs concurrently across groups, but stays sequential inside a group to keep message order.
+    - offsets are committed per partition, periodically and only after the batch was handed to the channel layer;
+      a group_send that still fails after retries holds its partition and rewinds it to the undelivered event.
+    - with unread counters, members' unread badges are bumped once per batch after the fan-out.
+    """
+
+    def __init__(self, consumer, channel_layer, batch_size=500, poll_timeout=1.0,
+                 commit_interval=1.0, stats_interval=10.0, report=None, unread=None,
+                 retry_attempts=3, retry_backoff=0.5):
+        self.consumer = consumer
+        self.channel_layer = channel_layer
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.commit_interval = commit_interval
+        self.stats_interval = stats_interval
+        self.report = report or (lambda stats: logger.info(self.format_stats(stats)))
+        self.unread = unread
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-bridge-poll")
+        self._stopping = False
+        # highest delivered offset per (topic, partition), not yet committed
+        self._pending = {}
+        self._last_commit = time.monotonic()
+        self._last_stats = time.monotonic()
+        self._delivered_since_stats = 0
+        self.delivered = 0
+        self.failed = 0
+
+    def stop(self):
+        self._stopping = True
+
+    def subscribe(self, topics):
+        self.consumer.subscribe(topics, on_assign=self.on_assign, on_revoke=self.on_revoke, on_lost=self.on_lost)
+
+    def on_assign(self, consumer, partitions):
+        logger.info(f"Assigned partitions: {[f'{p.topic}/{p.partition}' for p in partitions]}")
+
+    def on_revoke(self, consumer, partitions):
+        # runs inside consume(), between batches: commit what was delivered before losing the partitions
+        revoked = {(p.topic, p.partition) for p in partitions}
+        offsets = [
+            TopicPartition(topic, partition, offset + 1)
+            for (topic, partition), offset in self._pending.items()
+            if (topic, partition) in revoked
+        ]
+        if offsets:
+            try:
+                consumer.commit(offsets=offsets, asynchronous=False)
+            except Exception as e:
+                logger.error(f"Failed to commit offsets on revoke: {e}")
+        for key in revoked:
+            self._pending.pop(key, None)
+        logger.info(f"Revoked partitions: {sorted(f'{t}/{p}' for t, p in revoked)}")
+
+    def on_lost(self, consumer, partitions):
+        # partitions already belong to someone else, committing would fail; their events get redelivered
+        for p in partitions:
+            self._pending.pop((p.topic, p.partition), None)
+        logger.warning(f"Lost partitions: {[f'{p.topic}/{p.partition}' for p in partitions]}")
+
+    @staticmethod
+    def decode(value):
+        # json, msgpack or avro, negotiated from the event header
+        return decode_event(value)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._stopping:
+                messages = await loop.run_in_executor(
+                    self._executor, self.consumer.consume, self.batch_size, self.poll_timeout
+                )
+                if messages:
+                    await self.dispatch(messages)
+                now = time.monotonic()
+                if now - self._last_commit >= self.commit_interval:
+                    self.commit()
+                if now - self._last_stats >= self.stats_interval:
+                    self.report(self.stats())
+        finally:
+            self.commit(asynchronous=False)
+            self._executor.shutdown(wait=True)
+
+    async def dispatch(self, messages):
+        # group id -> [((topic, partition), offset, event, (message id, sender id))], in partition order
+        by_group = defaultdict(list)
+        offsets = {}
+        for msg in messages:
+            if msg.error():
+                if msg.error().code() != KafkaError._PARTITION_EOF:
+                    logger.error(f"Kafka consumer error: {msg.error()}")
+                continue
+            key = (msg.topic(), msg.partition())
+            offsets[key] = msg.offset()
+            try:
+                data = self.decode(msg.value())
+                by_group[data["group_id"]].append(
+                    (key, msg.offset(), realtime_event(data), (data["id"], data.get("sender_id")))
+                )
+            except Exception as e:
+                # a malformed event can never be delivered, skip it instead of blocking the partition
+                self.failed += 1
+                logger.error(f"Skipping undecodable event at {msg.topic()}/{msg.partition()}@{msg.offset()}: {e}")
+
+        delivered, undelivered = await self._deliver(by_group)
+
+        # a group's events all sit in one partition (the producer keys by group): that partition is held
+        # right before the group's first undelivered event and consumed again from there, never committed past it
+        held = {}
+        for entries in undelivered.values():
+            self.failed += len(entries)
+            key, offset = entries[0][0], entries[0][1]
+            held[key] = min(offset, held.get(key, offset))
+        for (topic, partition), offset in held.items():
+            offsets[(topic, partition)] = offset - 1
+            try:
+                self.consumer.seek(TopicPartition(topic, partition, offset))
+            except Exception as e:
+                logger.error(f"Failed to rewind {topic}/{partition} to {offset}: {e}")
+            logger.warning(f"Holding {topic}/{partition} at {offset}, its undelivered events will be consumed again")
+
+        senders = {
+            group_id: [entry[3] for entry in entries] for group_id, entries in delivered.items() if entries
+        }
+        if self.unread is not None and senders:
+            # badges are best effort, the periodic reconcile repairs a missed batch
+            try:
+                await self.unread.fanned_out(senders)
+            except Exception as e:
+                logger.error(f"Failed to update unread counters: {e}")
+
+        count = sum(len(entries) for entries in delivered.values())
+        self.delivered += count
+        self._delivered_since_stats += count
+        self._pending.update(offsets)
+
+    async def _deliver(self, by_group):
+        """
+        group_send every group's events, retrying the groups that failed with a growing backoff.
+        Returns ({group id: delivered entries}, {group id: entries still undelivered}).
+        """
+        delivered = defaultdict(list)
+        remaining = dict(by_group)
+        for attempt in range(self.retry_attempts + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            group_ids = list(remaining)
+            sent = await asyncio.gather(
+                *(self._send_group(group_id, [entry[2] for entry in remaining[group_id]]) for group_id in group_ids)
+            )
+            for group_id, count in zip(group_ids, sent):
+                delivered[group_id].extend(remaining[group_id][:count])
+                if count == len(remaining[group_id]):
+                    del remaining[group_id]
+                else:
+                    remaining[group_id] = remaining[group_id][count:]
+            if not remaining:
+                break
+        return delivered, remaining
+
+    async def _send_group(self, group_id, events):
+        # in order, stopping at the first failure so nothing overtakes it; returns how many went out
+        for index, event in enumerate(events):
+            try:
+                await self.channel_layer.group_send(group_id, event)
+            except Exception as e:
+                logger.error(f"group_send to {group_id} failed: {e}")
+                return index
+        return len(events)
+
+    def commit(self, asynchronous=True):
+        if not self._pending:
+            self._last_commit = time.monotonic()
+            return
+        offsets = [
+            TopicPartition(topic, partition, offset + 1)
+            for (topic, partition), offset in self._pending.items()
+        ]
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=asynchronous)
+            self._pending.clear()
+        except Exception as e:
+            logger.error(f"Failed to commit kafka offsets: {e}")
+        self._last_commit = time.monotonic()
+
+    def partitions(self):
+        try:
+            return sorted(f"{tp.topic}/{tp.partition}" for tp in self.consumer.assignment())
+        except Exception:
+            return []
+
+    def lag(self):
+        lag = {}
+        try:
+            for tp in self.consumer.assignment():
+                _, high = self.consumer.get_watermark_offsets(tp, cached=True)
+                position = self.consumer.position([tp])[0].offset
+                if high >= 0 and position >= 0:
+                    lag[f"{tp.topic}/{tp.partition}"] = max(high - position, 0)
+        except Exception as e:
+            logger.debug(f"Could not read consumer lag: {e}")
+        return lag
+
+    def stats(self):
+        now = time.monotonic()
+        elapsed = max(now - self._last_stats, 1e-9)
+        stats = {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "throughput": round(self._delivered_since_stats / elapsed, 1),
+            "lag": self.lag(),
+            "partitions": self.partitions(),
+        }
+        self._last_stats = now
+        self._delivered_since_stats = 0
+        return stats
+
+    @staticmethod
+    def format_stats(stats):
+        total_lag = sum(stats["lag"].values())
+        return (
+            f"delivered={stats['delivered']} failed={stats['failed']} "
+            f"throughput={stats['throughput']} msg/s lag={total_lag} {stats['lag']}"
+        )
@@ -0,0 +1,154 @@
+import time
+import queue
+import signal
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+
+def run_bridge_worker(index, options, stats_queue):
+    """
+    Entry point of one bridge worker process.
+    Workers share the consumer group, so kafka hands each of them a subset of the topic partitions.
+    """
+    import asyncio
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from channels.layers import get_channel_layer
+    from chat.kafka_bridge import KafkaChannelsBridge, build_consumer
+    from chat.unread import unread_counters
+
+    consumer = build_consumer(client_id=f"chat-bridge-{index}")
+    bridge = KafkaChannelsBridge(
+        consumer,
+        get_channel_layer(),
+        batch_size=options["batch_size"],
+        commit_interval=options["commit_interval"],
+        stats_interval=options["stats_interval"],
+        report=lambda stats: stats_queue.put((index, stats)),
+        unread=unread_counters,
+    )
+    bridge.subscribe([settings.KAFKA_TOPIC])
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, bridge.stop)
+        await bridge.run()
+
+    try:
+        asyncio.run(main())
+    finally:
+        consumer.close()
+
+
+class BridgeSupervisor:
+    """
+    Runs N bridge worker processes, restarts the ones that crash and merges their stats.
+    Uses spawn: the parent already holds librdkafka threads (the chat producer) which must not be forked.
+    """
+
+    def __init__(self, workers, options, report, max_backoff=30.0):
+        self.workers = workers
+        self.options = options
+        self.report = report
+        self.max_backoff = max_backoff
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stats_queue = self._ctx.Queue()
+        self._processes = {}
+        self._restarts = {}
+        self._next_start = {}
+        self._started_at = {}
+        self._latest = {}
+        self._stopping = False
+
+    def stop(self, *args):
+        self._stopping = True
+
+    def _start(self, index):
+        process = self._ctx.Process(
+            target=run_bridge_worker,
+            args=(index, self.options, self._stats_queue),
+            name=f"chat-bridge-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        logger.info(f"started bridge worker {index} (pid {process.pid})")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for index in range(self.workers):
+            process = self._processes.get(index)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                # crashed (or exited on its own): back off exponentially before restarting,
+                # a worker that stayed up for a while starts over from the smallest delay
+                stable = now - self._started_at.get(index, now) > self.max_backoff * 2
+                restarts = 1 if stable else self._restarts.get(index, 0) + 1
+                self._restarts[index] = restarts
+                self._next_start[index] = now + min(2 ** restarts, self.max_backoff)
+                self._processes[index] = None
+                self._latest.pop(index, None)
+                logger.warning(f"bridge worker {index} exited with code {process.exitcode}, restart #{restarts}")
+            if now >= self._next_start.get(index, 0):
+                self._start(index)
+
+    def _drain_stats(self):
+        while True:
+            try:
+                index, stats = self._stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._latest[index] = stats
+
+    def status(self):
+        workers = {}
+        for index in range(self.workers):
+            stats = self._latest.get(index, {})
+            process = self._processes.get(index)
+            workers[index] = {
+                "alive": bool(process and process.is_alive()),
+                "restarts": self._restarts.get(index, 0),
+                "throughput": stats.get("throughput", 0),
+                "delivered": stats.get("delivered", 0),
+                "lag": sum(stats.get("lag", {}).values()),
+                "partitions": stats.get("partitions", []),
+            }
+        return {
+            "workers": workers,
+            "throughput": round(sum(w["throughput"] for w in workers.values()), 1),
+            "delivered": sum(w["delivered"] for w in workers.values()),
+            "lag": sum(w["lag"] for w in workers.values()),
+        }
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        last_report = time.monotonic()
+        try:
+            while not self._stopping:
+                self._check_workers()
+                self._drain_stats()
+                if time.monotonic() - last_report >= self.options["stats_interval"]:
+                    self.report(self.status())
+                    last_report = time.monotonic()
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout=15):
+        for process in self._processes.values():
+            if process is not None and process.is_alive():
+                process.terminate()  # SIGTERM -> bridge commits and closes its consumer
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            if process is None:
+                continue
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
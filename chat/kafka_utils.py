@@ -1,31 +1,189 @@
 # kafka_utils.py
-import json
+import time
+import asyncio
 import logging
+import threading
+from collections import deque
 from confluent_kafka import Producer
 from django.conf import settings
+from chat.codecs import encode_event
 
 logger = logging.getLogger(__name__)
 
-producer = Producer({"bootstrap.servers": settings.KAFKA_BROKER_URL})
+PRODUCER_CONFIG = {
+    "bootstrap.servers": settings.KAFKA_BROKER_URL,
+    # batch small chat events together instead of one request per message
+    "linger.ms": 5,
+    "batch.num.messages": 1000,
+    "compression.type": "lz4",
+    # retries must not reorder messages of a group inside its partition
+    "enable.idempotence": True,
+    **getattr(settings, "KAFKA_PRODUCER_CONFIG", {}),
+}
 
 
-def delivery_report(err, msg):
-    if err:
-        logger.error(f"Message delivery failed: {err}")
-    else:
-        logger.info(f"Delivered to {msg.topic()} [{msg.partition()}] offset {msg.offset()}")
+class AsyncEventProducer:
+    """
+    Kafka producer usable from async code without sync_to_async.
+    - records are keyed by group_id, so every message of a group lands in the same partition, in order.
+    - a full local queue blocks the caller (backpressure) instead of dropping the event.
+    - delivery callbacks are served by one background poll thread, which also tracks delivery latency
+      and logs stats() every stats_interval seconds while events flow.
+    """
 
+    def __init__(self, config, max_block=10.0, latency_samples=1000, stats_interval=60.0):
+        self._producer = Producer(config)
+        self.max_block = max_block
+        self.stats_interval = stats_interval
+        self._poll_thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_samples)
+        self.delivered = 0
+        self.failed = 0
+        self.backpressure_waits = 0
 
-def send_realtime_event(topic, message_data, origin=None):
-    if origin:
-        message_data["origin"] = origin
-    try:
-        producer.produce(
-            topic,
-            value=json.dumps(message_data).encode("utf-8"),
-            callback=delivery_report
+    def _ensure_polling(self):
+        if self._running:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._poll_thread = threading.Thread(target=self._poll_loop, name="kafka-producer-poll", daemon=True)
+            self._poll_thread.start()
+
+    def _poll_loop(self):
+        last_stats = time.monotonic()
+        reported = (0, 0)
+        while self._running:
+            self._producer.poll(0.1)
+            now = time.monotonic()
+            if now - last_stats >= self.stats_interval:
+                last_stats = now
+                # idle producers stay quiet
+                if (self.delivered, self.failed) != reported:
+                    reported = (self.delivered, self.failed)
+                    logger.info(f"kafka producer stats: {self.stats()}")
+
+    def _on_delivery(self, started_at, future=None, loop=None):
+        def callback(err, msg):
+            if err:
+                self.failed += 1
+                logger.error(f"Message delivery failed for {msg.topic()} key {msg.key()}: {err}")
+            else:
+                self.delivered += 1
+                self._latencies.append(time.monotonic() - started_at)
+            if future is not None:
+                try:
+                    loop.call_soon_threadsafe(self._resolve, future, err)
+                except RuntimeError:
+                    # the loop that queued the event is already closed
+                    pass
+        return callback
+
+    @staticmethod
+    def _resolve(future, err):
+        if future.done():
+            return
+        if err:
+            future.set_exception(RuntimeError(str(err)))
+        else:
+            future.set_result(True)
+
+    @staticmethod
+    def _encode(message_data, origin):
+        if origin:
+            message_data["origin"] = origin
+        key = message_data.get("group_id")
+        return (
+            encode_event(message_data),
+            str(key).encode("utf-8") if key else None,
         )
-        # allow background thread to handle delivery callbacks
-        producer.poll(0)
-    except BufferError as e:
-        logger.error(f"Local producer queue is full: {e}")
+
+    async def send(self, topic, message_data, origin=None, wait=False):
+        """
+        Queue an event. Only waits when the local queue is full; delivery errors are logged by the callback.
+        wait=True returns a future resolved (or failed) on broker delivery instead of None.
+        """
+        self._ensure_polling()
+        value, key = self._encode(message_data, origin)
+        loop = asyncio.get_running_loop() if wait else None
+        future = loop.create_future() if wait else None
+        deadline = time.monotonic() + self.max_block
+        while True:
+            try:
+                self._producer.produce(
+                    topic,
+                    value=value,
+                    key=key,
+                    on_delivery=self._on_delivery(time.monotonic(), future, loop)
+                )
+                return future
+            except BufferError:
+                if time.monotonic() > deadline:
+                    raise
+                self.backpressure_waits += 1
+                await asyncio.sleep(0.01)
+
+    async def send_batch(self, topic, events, origin=None, wait=False):
+        """
+        Queue the events in order, so librdkafka ships them in as few requests as possible.
+        Returns what send() returned for each queued event; a shorter list than events when the local queue
+        stayed full past max_block, the rest were not queued.
+        """
+        queued = []
+        for message_data in events:
+            try:
+                queued.append(await self.send(topic, message_data, origin=origin, wait=wait))
+            except BufferError as e:
+                logger.error(f"producer queue still full, {len(events) - len(queued)} of {len(events)} events not queued: {e}")
+                break
+        return queued
+
+    def produce(self, topic, message_data, origin=None):
+        # blocking counterpart of send() for sync callers (views, celery tasks)
+        self._ensure_polling()
+        value, key = self._encode(message_data, origin)
+        deadline = time.monotonic() + self.max_block
+        while True:
+            try:
+                self._producer.produce(
+                    topic,
+                    value=value,
+                    key=key,
+                    on_delivery=self._on_delivery(time.monotonic())
+                )
+                return
+            except BufferError:
+                if time.monotonic() > deadline:
+                    raise
+                self.backpressure_waits += 1
+                self._producer.poll(0.01)
+
+    def flush(self, timeout=5):
+        self._running = False
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout)
+            self._poll_thread = None
+        remaining = self._producer.flush(timeout)
+        if remaining:
+            logger.warning(f"{remaining} kafka events still undelivered after flush")
+        return remaining
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        count = len(latencies)
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "queued": len(self._producer),
+            "backpressure_waits": self.backpressure_waits,
+            "latency_avg_ms": round(sum(latencies) / count * 1000, 2) if count else None,
+            "latency_p50_ms": round(latencies[count // 2] * 1000, 2) if count else None,
+            "latency_p99_ms": round(latencies[min(count - 1, int(count * 0.99))] * 1000, 2) if count else None,
+        }
+
+
+event_producer = AsyncEventProducer(PRODUCER_CONFIG, stats_interval=getattr(settings, "KAFKA_PRODUCER_STATS_INTERVAL", 60.0))
+
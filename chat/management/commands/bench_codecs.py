@@ -0,0 +1,49 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.codecs import CODECS, encode_event, decode_event
+from chat.crypto import encrypt_text
+
+
+class Command(BaseCommand):
+    help = "Benchmark bytes/event and encode/decode time of the realtime event codecs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events",
+            type=int,
+            default=20000,
+            help="Events encoded and decoded per codec (default: 20000)"
+        )
+
+    def handle(self, *args, **options):
+        count = options["events"]
+        events = [
+            {
+                "id": str(uuid.uuid4()),
+                "sender_id": 1000 + i % 50,
+                "sender_name": f"member number {i % 50}",
+                "group_id": "6f1c2a0e-4f1e-4b8e-9d55-2f0b7d1c9a11",
+                "message": encrypt_text(f"message {i} " * 3),
+                "file": None,
+                "message_type": "text",
+                "timestamp": timezone.now().isoformat(),
+                "origin": "specific.a1b2c3d4!e5f6a7b8c9d0",
+            }
+            for i in range(count)
+        ]
+
+        self.stdout.write(f"{'codec':>8} {'bytes/event':>12} {'encode us':>10} {'decode us':>10}")
+        for name in CODECS:
+            start = time.perf_counter()
+            encoded = [encode_event(event, codec=name) for event in events]
+            encode_time = (time.perf_counter() - start) / count
+
+            start = time.perf_counter()
+            decoded = [decode_event(value) for value in encoded]
+            decode_time = (time.perf_counter() - start) / count
+
+            assert decoded[0]["message"] == events[0]["message"]
+            size = sum(len(value) for value in encoded) / count
+            self.stdout.write(f"{name:>8} {size:>12.1f} {encode_time * 1e6:>10.2f} {decode_time * 1e6:>10.2f}")
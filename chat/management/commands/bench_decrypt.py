@@ -0,0 +1,49 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.crypto import encrypt_text, decrypt_text, decrypt_many, decrypted_cache
+from chat.ids import uuid7
+
+
+class Command(BaseCommand):
+    help = "Benchmark message page decryption: per row, batched on the worker pool, and served from the LRU."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=200,
+            help="Distinct pages decrypted per mode (default: 200)"
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=50,
+            help="Messages per page (default: 50)"
+        )
+
+    def handle(self, *args, **options):
+        size = options["page_size"]
+        pages = [
+            [(uuid7(), encrypt_text(f"message {page}-{i} from the decryption benchmark " * 3)) for i in range(size)]
+            for page in range(options["pages"])
+        ]
+        self.stdout.write(
+            f"{len(pages)} pages x {size} messages, {settings.CHAT_DECRYPT_WORKERS} workers, "
+            f"pool from {settings.CHAT_DECRYPT_PARALLEL_MIN} messages"
+        )
+
+        def run(label, decrypt_page):
+            start = time.perf_counter()
+            for page in pages:
+                decrypt_page(page)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{label:>22}: {len(pages) / elapsed:>9.1f} pages/s")
+            return elapsed
+
+        decrypted_cache.clear()
+        run("per row (old)", lambda page: [decrypt_text(token) for _, token in page])
+        run("batch, no cache", lambda page: decrypt_many(page, cache=False))
+        run("batch, cold cache", decrypt_many)
+        run("batch, warm cache", decrypt_many)
+        self.stdout.write(f"cache: {decrypted_cache.stats()}")
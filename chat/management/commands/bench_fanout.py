@@ -0,0 +1,73 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.crypto import encrypt_text, decrypt_text
+from chat.frames import realtime_event
+
+
+def per_socket_frame(data):
+    # the old path: every socket decrypted and serialized the message itself.
+    return json.dumps({
+        "id": data.get("id"),
+        "type": data.get("message_type", "text"),
+        "message": decrypt_text(data.get("message")),
+        "sender_id": data.get("sender_id"),
+        "sender_name": data.get("sender_name"),
+        "file": data.get("file"),
+        "timestamp": data.get("timestamp")
+    })
+
+
+class Command(BaseCommand):
+    help = "Benchmark CPU per delivered message against group size for realtime fan-out."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=str,
+            default="1,10,100,1000,2000",
+            help="Comma separated group sizes to benchmark (default: 1,10,100,1000,2000)"
+        )
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=20,
+            help="Messages fanned out per group size (default: 20)"
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s]
+        messages = options["messages"]
+        data = {
+            "id": "bench",
+            "sender_id": 1,
+            "sender_name": "bench user",
+            "group_id": "00000000-0000-0000-0000-000000000000",
+            "message": encrypt_text("hello from the fan-out benchmark " * 4),
+            "file": None,
+            "message_type": "text",
+            "timestamp": timezone.now().isoformat(),
+        }
+
+        self.stdout.write(f"{'members':>8} {'per-socket us/msg':>18} {'pre-built us/msg':>17} {'speedup':>8}")
+        for size in sizes:
+            sink = []
+
+            start = time.process_time()
+            for _ in range(messages):
+                for _ in range(size):
+                    sink.append(per_socket_frame(data))
+            old = (time.process_time() - start) / (messages * size)
+            sink.clear()
+
+            start = time.process_time()
+            for _ in range(messages):
+                event = realtime_event(data)
+                for _ in range(size):
+                    sink.append(event["frame"])
+            new = (time.process_time() - start) / (messages * size)
+
+            self.stdout.write(
+                f"{size:>8} {old * 1e6:>18.2f} {new * 1e6:>17.2f} {old / new if new else 0:>7.1f}x"
+            )
@@ -0,0 +1,64 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from chat.crypto import encrypt_text
+from chat.ids import uuid7
+from chat.models import ChatGroup, GroupChat
+
+KEY_FUNCTIONS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark GroupChat insert throughput with random (uuid4) and time ordered (uuid7) primary keys. "
+        "Everything runs in a rolled back transaction, no rows are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=50000,
+            help="Messages inserted per key type (default: 50000)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows per bulk insert (default: 500)"
+        )
+        parser.add_argument(
+            "--prefill",
+            type=int,
+            default=0,
+            help="Rows inserted first with the same key type, so the index is already large (default: 0)"
+        )
+
+    def handle(self, *args, **options):
+        text = encrypt_text("hello from the insert benchmark")
+        self.stdout.write(f"{'keys':>6} {'rows':>8} {'seconds':>8} {'rows/s':>10}")
+        results = {}
+        for name, new_key in KEY_FUNCTIONS.items():
+            with transaction.atomic():
+                user = get_user_model().objects.create(email=f"bench-inserts-{uuid.uuid4().hex}@example.com", name="bench")
+                group = ChatGroup.objects.create(group_owner=user, group_name=f"bench-inserts-{uuid.uuid4().hex}")
+
+                def insert(count):
+                    for start in range(0, count, options["batch_size"]):
+                        GroupChat.objects.bulk_create([
+                            GroupChat(uid=new_key(), group=group, sent_by=user, message_type="text", text_message=text)
+                            for _ in range(min(options["batch_size"], count - start))
+                        ])
+
+                insert(options["prefill"])
+                began = time.perf_counter()
+                insert(options["rows"])
+                elapsed = time.perf_counter() - began
+                transaction.set_rollback(True)
+
+            results[name] = options["rows"] / elapsed
+            self.stdout.write(f"{name:>6} {options['rows']:>8} {elapsed:>8.2f} {results[name]:>10.0f}")
+
+        self.stdout.write(f"uuid7 vs uuid4: {results['uuid7'] / results['uuid4']:.2f}x")
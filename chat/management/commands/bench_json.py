@@ -0,0 +1,98 @@
+import io
+import json
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from chat import fastjson
+from chat.crypto import encrypt_text
+from chat.ids import uuid7
+from chat.models import ChatGroup, GroupChat
+from chat.renderers import FastJSONRenderer, FastJSONParser
+from chat.serializers import ChatSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the JSON layer on realistic message pages: DRF's renderer/parser against chat.renderers, "
+        "and stdlib json against chat.fastjson for websocket frames. Nothing touches the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=500,
+            help="Pages rendered and parsed per mode (default: 500)"
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=50,
+            help="Messages per page (default: 50)"
+        )
+
+    def handle(self, *args, **options):
+        size = options["page_size"]
+        senders = [get_user_model()(id=i, email=f"user{i}@example.com", name=f"User {i}") for i in range(1, 9)]
+        group = ChatGroup(uid=uuid.uuid4(), group_name="bench-json")
+        rows = [
+            GroupChat(
+                uid=uuid7(), group=group, sent_by=senders[i % len(senders)], message_type="text",
+                text_message=encrypt_text(f"message {i} from the json benchmark, with some ünïcödé 🚀 " * 2),
+                created_at=timezone.now(),
+            )
+            for i in range(size)
+        ]
+        # the MessageAPI envelope as the renderer sees it
+        page = {
+            "status": True,
+            "message": "messages fetched.",
+            "data": {
+                "results": ChatSerializer(rows, many=True).data,
+                "before": str(rows[0].uid),
+                "after": str(rows[-1].uid),
+                "has_before": True,
+                "has_after": False,
+            },
+        }
+        # realtime events carry raw ids and datetimes, the native types of the fast path
+        events = [
+            {"id": row.uid, "group_id": group.uid, "sender_id": row.sent_by_id, "message": "hello",
+             "timestamp": row.created_at, "message_type": "text"}
+            for row in rows
+        ]
+        body = JSONRenderer().render(page)
+        self.stdout.write(
+            f"backend: {fastjson.BACKEND}, {options['pages']} pages x {size} messages, {len(body) / 1024:.1f} KB per page"
+        )
+
+        def run(label, func, payload, count=options["pages"]):
+            start = time.perf_counter()
+            for _ in range(count):
+                func(payload)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{label:>28}: {count / elapsed:>10.1f} ops/s")
+            return count / elapsed
+
+        results = {}
+        drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        results["render"] = (
+            run("render, DRF", drf_renderer.render, page),
+            run("render, fast", fast_renderer.render, page),
+        )
+        drf_parser, fast_parser = JSONParser(), FastJSONParser()
+        context = {"encoding": "utf-8"}
+        results["parse"] = (
+            run("parse, DRF", lambda raw: drf_parser.parse(io.BytesIO(raw), parser_context=context), body),
+            run("parse, fast", lambda raw: fast_parser.parse(io.BytesIO(raw), parser_context=context), body),
+        )
+        results["frames"] = (
+            run("frames, json", lambda items: [json.dumps(item, default=str) for item in items], events),
+            run("frames, fast", lambda items: [fastjson.dumps(item) for item in items], events),
+        )
+        for name, (old, new) in results.items():
+            self.stdout.write(f"{name}: {new / old:.2f}x")
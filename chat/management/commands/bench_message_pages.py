@@ -0,0 +1,75 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+from chat.crypto import encrypt_text
+from chat.models import ChatGroup, GroupChat, Member
+from chat.views import MessageAPI
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark MessageAPI page latency as a group's history grows (newest page and a page deep in history). "
+        "Rows are inserted in a rolled back transaction, nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=str,
+            default="10000,100000,1000000",
+            help="Comma separated history sizes to measure at (default: 10000,100000,1000000)"
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=50,
+            help="Page size (default: 50)"
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Requests per measurement, the median is reported (default: 5)"
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options["sizes"].split(",") if s)
+        factory = APIRequestFactory()
+        view = MessageAPI.as_view()
+        text = encrypt_text("hello from the pagination benchmark")
+
+        with transaction.atomic():
+            user = get_user_model().objects.create(email=f"bench-pages-{uuid.uuid4().hex}@example.com", name="bench")
+            group = ChatGroup.objects.create(group_owner=user, group_name=f"bench-pages-{uuid.uuid4().hex}")
+            Member.objects.create(group=group, member=user, role="admin")
+
+            def page_ms(**params):
+                timings = []
+                for _ in range(options["repeat"]):
+                    request = factory.get("/messages/", {"group": str(group.uid), "limit": options["limit"], **params})
+                    force_authenticate(request, user=user)
+                    began = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    timings.append((time.perf_counter() - began) * 1000)
+                    assert response.status_code == 200, response.data
+                return sorted(timings)[len(timings) // 2]
+
+            self.stdout.write(f"{'history':>10} {'newest page ms':>15} {'deep page ms':>13}")
+            inserted = 0
+            for size in sizes:
+                while inserted < size:
+                    batch = min(5000, size - inserted)
+                    GroupChat.objects.bulk_create([
+                        GroupChat(group=group, sent_by=user, message_type="text", text_message=text)
+                        for _ in range(batch)
+                    ])
+                    inserted += batch
+                # a cursor 10% into the history, i.e. a client that scrolled far back
+                deep = GroupChat.objects.filter(group=group).order_by("uid").values_list("uid", flat=True)[size // 10]
+                self.stdout.write(f"{size:>10} {page_ms():>15.2f} {page_ms(before=str(deep)):>13.2f}")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,80 @@
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from chat.crypto import encrypt_text, decrypt_many
+from chat.ids import uuid7
+from chat.models import ChatGroup, GroupChat
+from chat.serializers import ChatSerializer, MessageRowSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark message page serialization: ChatSerializer on model rows against MessageRowSerializer "
+        "on the equivalent .values() rows. Rows are built in memory, nothing touches the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=20,
+            help="Pages serialized per mode (default: 20)"
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=1000,
+            help="Messages per page (default: 1000)"
+        )
+        parser.add_argument(
+            "--senders",
+            type=int,
+            default=20,
+            help="Distinct senders in a page (default: 20)"
+        )
+
+    def handle(self, *args, **options):
+        size = options["page_size"]
+        senders = [
+            get_user_model()(id=i, email=f"user{i}@example.com", name=f"User {i}", profile_image=f"profile/user{i}.png")
+            for i in range(1, options["senders"] + 1)
+        ]
+        group = ChatGroup(uid=uuid.uuid4(), group_name="bench-serializers")
+        rows = [
+            GroupChat(
+                uid=uuid7(), group=group, sent_by=senders[i % len(senders)], message_type="text",
+                text_message=encrypt_text(f"message {i} from the serializer benchmark"), created_at=timezone.now(),
+            )
+            for i in range(size)
+        ]
+        values = [
+            {
+                "uid": row.uid, "group_id": group.uid, "sent_by_id": row.sent_by.id, "message_type": row.message_type,
+                "text_message": row.text_message, "file_message": row.file_message, "created_at": row.created_at,
+                "sent_by__email": row.sent_by.email, "sent_by__name": row.sent_by.name,
+                "sent_by__profile_image": row.sent_by.profile_image.name,
+            }
+            for row in rows
+        ]
+        # a request makes both build absolute profile_image urls, as MessageAPI does
+        context = {"request": Request(APIRequestFactory().get("/chat/messages/", HTTP_HOST="localhost"))}
+        # both paths decrypt through decrypt_many; warm its cache so only serialization is measured
+        decrypt_many([(row.uid, row.text_message) for row in rows])
+        self.stdout.write(f"{options['pages']} pages x {size} messages, {len(senders)} senders")
+
+        def run(label, serialize):
+            serialize()
+            start = time.perf_counter()
+            for _ in range(options["pages"]):
+                serialize()
+            rate = options["pages"] * size / (time.perf_counter() - start)
+            self.stdout.write(f"{label:>22}: {rate:>12.0f} rows/s")
+            return rate
+
+        old = run("ChatSerializer", lambda: ChatSerializer(rows, many=True, context=context).data)
+        new = run("MessageRowSerializer", lambda: MessageRowSerializer(values, context=context).data)
+        self.stdout.write(f"MessageRowSerializer vs ChatSerializer: {new / old:.1f}x")
@@ -1,56 +1,87 @@
 # kafka_consumer.py
-import json
+import signal
+import asyncio
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from confluent_kafka import Consumer, KafkaError
+from chat.kafka_bridge import KafkaChannelsBridge, build_consumer
+from chat.kafka_supervisor import BridgeSupervisor
+from chat.unread import unread_counters
 
 
 class Command(BaseCommand):
     help = 'Runs a Kafka consumer to push messages to Django Channels.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Max messages consumed and dispatched per batch (default: 500)"
+        )
+        parser.add_argument(
+            "--commit-interval",
+            type=float,
+            default=1.0,
+            help="Seconds between offset commits (default: 1.0)"
+        )
+        parser.add_argument(
+            "--stats-interval",
+            type=float,
+            default=30.0,
+            help="Seconds between throughput/lag reports (default: 30)"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Bridge worker processes sharing the topic partitions; >1 runs a supervisor (default: 1)"
+        )
+
     def handle(self, *args, **options):
         self.stdout.write("Starting Kafka consumer")
-        channel_layer = get_channel_layer()
 
-        conf = {
-            "bootstrap.servers": settings.KAFKA_BROKER_URL,
-            "group.id": "django_websocket_consumer_group",
-            "enable.auto.commit": False,  # <- let it commit offsets
-            "auto.offset.reset": "latest"
-        }
-        consumer = Consumer(**conf)
-        consumer.subscribe([settings.KAFKA_TOPIC])
+        if options["workers"] > 1:
+            self.stdout.write(f"Supervising {options['workers']} kafka bridge workers")
+            supervisor = BridgeSupervisor(options["workers"], options, report=self.write_status)
+            supervisor.run()
+            self.stdout.write("kafka consumer stopped.")
+            return
+
+        consumer = build_consumer()
+        bridge = KafkaChannelsBridge(
+            consumer,
+            get_channel_layer(),
+            batch_size=options["batch_size"],
+            commit_interval=options["commit_interval"],
+            stats_interval=options["stats_interval"],
+            report=lambda stats: self.stdout.write(bridge.format_stats(stats)),
+            unread=unread_counters,
+        )
+        bridge.subscribe([settings.KAFKA_TOPIC])
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, bridge.stop)
+            await bridge.run()
 
         try:
-            while True:
-                msg = consumer.poll(timeout=1.0)
-                if msg is None:
-                    self.stdout.write("No message polled this cycle.")
-                    continue
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        self.stdout.write(f"End of partition reached {msg.topic()}/{msg.partition()}")
-                    else:
-                        self.stdout.write(f"Kafka consumer error: {msg.error()}")
-                    continue
-
-                message_value = msg.value().decode('utf-8')
-                data = json.loads(message_value)
-
-                async_to_sync(channel_layer.group_send)(
-                    data["group_id"],
-                    {
-                        "type": "send_realtime_data",
-                        "data": data
-                    }
-                )
-                consumer.commit(asynchronous=False)
-        except KeyboardInterrupt:
+            asyncio.run(main())
             self.stdout.write("Kafka consumer intrrupted. Shutting down...")
         except Exception as e:
             self.stdout.write(f"An unexpected error occurred in kafka consumer: {e}")
         finally:
             consumer.close()
             self.stdout.write("kafka consumer stopped.")
+
+    def write_status(self, status):
+        self.stdout.write(
+            f"workers={len(status['workers'])} throughput={status['throughput']} msg/s "
+            f"delivered={status['delivered']} lag={status['lag']}"
+        )
+        for index, worker in status["workers"].items():
+            self.stdout.write(
+                f"  worker {index}: alive={worker['alive']} restarts={worker['restarts']} "
+                f"throughput={worker['throughput']} msg/s lag={worker['lag']} partitions={worker['partitions']}"
+            )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def membership_cache_key(group_id, user_id):
+    return f"membership:{group_id}:{user_id}"
+
+
+def import_job_key(job_id):
+    # group and requester of a member import job, so only the group's admins can follow it
+    return f"membership:import:{job_id}"
+
+
+def is_group_admin(group_id, user_id):
+    from chat.models import Member
+
+    return Member.objects.filter(group_id=group_id, member_id=user_id, role="admin").exists()
+
+
+def is_group_member(group_id, user_id):
+    """
+    Membership check with the same cost for any group size: an exists() on the (group, member) index,
+    cached for CHAT_MEMBERSHIP_CACHE_TTL seconds. notify_membership_changed drops the cached answer.
+    """
+    key = membership_cache_key(group_id, user_id)
+    member = cache.get(key)
+    if member is None:
+        from chat.models import Member
+
+        member = Member.objects.filter(group_id=group_id, member_id=user_id).exists()
+        cache.set(key, member, settings.CHAT_MEMBERSHIP_CACHE_TTL)
+    return member
+
+
+def forget_membership(group_id, user_ids):
+    cache.delete_many([membership_cache_key(group_id, user_id) for user_id in user_ids])
+
+
+def add_members(group, user_ids, role="regular"):
+    """
+    Add users to a group with a fixed number of queries, whatever the number of ids:
+    one query resolves the ids, one finds who is already a member, one bulk insert adds the rest.
+    ignore_conflicts + the (group, member) unique constraint make a concurrent add of the same user harmless.
+    Returns (added user ids, already member ids, unknown ids).
+    """
+    from django.contrib.auth import get_user_model
+    from chat.models import Member
+
+    requested = {int(user_id) for user_id in user_ids}
+    found = set(get_user_model().objects.filter(id__in=requested).values_list("id", flat=True))
+    existing = set(Member.objects.filter(group=group, member_id__in=found).values_list("member_id", flat=True))
+    added = sorted(found - existing)
+    Member.objects.bulk_create(
+        [Member(group=group, member_id=user_id, role=role) for user_id in added],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    return added, sorted(existing), sorted(requested - found)
+
+
+def contacts_among(user_id, user_ids):
+    """The subset of user_ids sharing at least one group with user_id, in one query."""
+    from chat.models import Member
+
+    return set(
+        Member.objects.filter(member_id__in=user_ids, group__group_members__member_id=user_id)
+        .values_list("member_id", flat=True)
+        .distinct()
+    )
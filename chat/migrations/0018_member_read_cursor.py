@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0017_alter_groupchat_file_message_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.groupchat'),
+        ),
+    ]
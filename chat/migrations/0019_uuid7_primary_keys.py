@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:45
+
+import chat.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0018_member_read_cursor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatgroup',
+            name='uid',
+            field=models.UUIDField(default=chat.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='uid',
+            field=models.UUIDField(default=chat.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='groupchat',
+            name='uid',
+            field=models.UUIDField(default=chat.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='uid',
+            field=models.UUIDField(default=chat.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='joinrequest',
+            name='uid',
+            field=models.UUIDField(default=chat.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='member',
+            name='uid',
+            field=models.UUIDField(default=chat.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
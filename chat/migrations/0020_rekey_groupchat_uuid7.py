@@ -0,0 +1,81 @@
+from django.db import migrations, transaction
+
+from chat.ids import uuid7_from_datetime
+
+BATCH_SIZE = 1000
+MAPPING_TABLE = "chat_rekey_groupchat"
+
+
+def rekey_messages(apps, schema_editor):
+    """
+    Give existing messages uuid7 ids derived from their created_at, so the primary key
+    orders old and new messages alike. References (deleted_for, member read cursors) follow the new ids.
+    Each batch fills a temporary old -> new mapping table and rewrites the three tables with one
+    UPDATE ... FROM join each, in its own transaction; the foreign keys are deferred, so they are checked
+    when the batch commits and no lock is held across the whole table.
+    """
+    GroupChat = apps.get_model("chat", "GroupChat")
+    Member = apps.get_model("chat", "Member")
+    DeletedFor = GroupChat.deleted_for.through
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    pk = GroupChat._meta.pk
+    targets = [
+        (GroupChat._meta.db_table, pk.column),
+        (DeletedFor._meta.db_table, DeletedFor._meta.get_field("groupchat").column),
+        (Member._meta.db_table, Member._meta.get_field("last_read_message").column),
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {MAPPING_TABLE} "
+            f"(old_uid {pk.db_type(connection)} PRIMARY KEY, new_uid {pk.db_type(connection)} NOT NULL)"
+        )
+        try:
+            # keyset walk over the primary key; rows rekeyed behind or ahead of the cursor are v7 and skipped
+            last = None
+            while True:
+                rows = GroupChat.objects.order_by("uid")
+                if last is not None:
+                    rows = rows.filter(uid__gt=last)
+                page = list(rows.values_list("uid", "created_at")[:BATCH_SIZE])
+                if not page:
+                    break
+                last = page[-1][0]
+                batch = [(uid, uuid7_from_datetime(created_at)) for uid, created_at in page if uid.version != 7]
+                if not batch:
+                    continue
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute(f"DELETE FROM {MAPPING_TABLE}")
+                    _fill_mapping(cursor, connection, pk, batch)
+                    for table, column in targets:
+                        cursor.execute(
+                            f"UPDATE {quote(table)} SET {quote(column)} = {MAPPING_TABLE}.new_uid "
+                            f"FROM {MAPPING_TABLE} WHERE {quote(table)}.{quote(column)} = {MAPPING_TABLE}.old_uid"
+                        )
+        finally:
+            cursor.execute(f"DROP TABLE {MAPPING_TABLE}")
+
+
+def _fill_mapping(cursor, connection, pk, batch):
+    # multi row INSERTs, split to stay under the backend's bound parameter limit
+    per_statement = min(len(batch), (connection.features.max_query_params or 2 * len(batch)) // 2)
+    for start in range(0, len(batch), per_statement):
+        chunk = batch[start:start + per_statement]
+        cursor.execute(
+            f"INSERT INTO {MAPPING_TABLE} (old_uid, new_uid) VALUES " + ", ".join(["(%s, %s)"] * len(chunk)),
+            [pk.get_db_prep_value(value, connection) for pair in chunk for value in pair],
+        )
+
+
+class Migration(migrations.Migration):
+    # batches commit one by one instead of locking every message row until the end
+    atomic = False
+
+    dependencies = [
+        ('chat', '0019_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_messages, migrations.RunPython.noop),
+    ]
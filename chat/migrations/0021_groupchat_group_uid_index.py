@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0020_rekey_groupchat_uuid7'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupchat',
+            index=models.Index(fields=['group', 'uid'], name='chat_message_group_uid_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0021_groupchat_group_uid_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='cleared_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0022_member_cleared_before'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['group', 'member'], name='chat_member_group_member_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_activity(apps, schema_editor):
+    # existing groups: newest message if any, otherwise the group's creation time
+    ChatGroup = apps.get_model("chat", "ChatGroup")
+    GroupChat = apps.get_model("chat", "GroupChat")
+    for group in ChatGroup.objects.only("uid", "created_at").iterator():
+        last = GroupChat.objects.filter(group_id=group.uid).order_by("-uid").first()
+        if last is None:
+            ChatGroup.objects.filter(uid=group.uid).update(last_activity_at=group.created_at)
+            continue
+        ChatGroup.objects.filter(uid=group.uid).update(
+            last_activity_at=last.created_at,
+            last_message_uid=last.uid,
+            last_message_text=last.text_message,
+            last_message_type=last.message_type,
+            last_message_sender_id=last.sent_by_id,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0023_member_group_member_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatgroup',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='chatgroup',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chatgroup',
+            name='last_message_text',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatgroup',
+            name='last_message_type',
+            field=models.CharField(blank=True, choices=[('text', 'text'), ('file', 'file'), ('form', 'form')], max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatgroup',
+            name='last_message_uid',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatgroup',
+            index=models.Index(fields=['-last_activity_at', '-uid'], name='chat_group_activity_idx'),
+        ),
+    ]
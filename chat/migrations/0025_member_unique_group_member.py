@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_members(apps, schema_editor):
+    # keep one row per (group, member) before the unique constraint: an admin row if any, else the oldest
+    Member = apps.get_model("chat", "Member")
+    duplicates = (
+        Member.objects.values("group_id", "member_id")
+        .annotate(rows=Count("uid"))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        rows = list(
+            Member.objects.filter(group_id=duplicate["group_id"], member_id=duplicate["member_id"])
+            .order_by("created_at")
+        )
+        keep = next((row for row in rows if row.role == "admin"), rows[0])
+        Member.objects.filter(uid__in=[row.uid for row in rows if row.uid != keep.uid]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0024_chatgroup_last_activity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_members, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='member',
+            constraint=models.UniqueConstraint(fields=('group', 'member'), name='chat_member_unique_group_member'),
+        ),
+        migrations.RemoveIndex(
+            model_name='member',
+            name='chat_member_group_member_idx',
+        ),
+    ]
@@ -1,12 +1,13 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from chat.choices import GROUP_TYPES, MESSAGE_TYPE, ROLE_CHOICES
-import uuid
+from chat.ids import uuid7
 from django.utils import timezone
 
 
 class Base(models.Model):
-    uid = models.UUIDField(default=uuid.uuid4, primary_key=True, unique=True, editable=False)
+    # time ordered, so inserts append to the index and the pk alone orders rows by creation
+    uid = models.UUIDField(default=uuid7, primary_key=True, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -25,6 +26,17 @@ class ChatGroup(Base):
     group_description = models.TextField(null=True, blank=True)
     group_profile = models.ForeignKey(Image, related_name="group_image", on_delete=models.SET_NULL, null=True, blank=True)
     group_type = models.CharField(max_length=100, choices=GROUP_TYPES, default='private')
+    # newest message, denormalized at write time so the inbox is one query (see chat/utils.record_group_activity)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    last_message_uid = models.UUIDField(null=True, blank=True)
+    last_message_text = models.TextField(null=True, blank=True)
+    last_message_type = models.CharField(max_length=100, choices=MESSAGE_TYPE, null=True, blank=True)
+    last_message_sender = models.ForeignKey(User, related_name="+", on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-last_activity_at", "-uid"], name="chat_group_activity_idx"),
+        ]
 
     def __str__(self):
         return self.group_name
@@ -44,6 +56,17 @@ class Member(Base):
     group = models.ForeignKey(ChatGroup, on_delete=models.CASCADE, related_name="group_members")
     member = models.ForeignKey(User, related_name="joined_groups", on_delete=models.CASCADE)
     role = models.CharField(max_length=100, default="regular", choices=ROLE_CHOICES)
+    # read cursor, advanced from the websocket; unread badges are kept in redis (see chat/unread.py)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    last_read_message = models.ForeignKey("GroupChat", related_name="+", on_delete=models.SET_NULL, null=True, blank=True)
+    # "clear all messages": messages of others created before this are hidden for the member
+    cleared_before = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # one membership per user and group; its index also serves the membership exists() checks
+            models.UniqueConstraint(fields=["group", "member"], name="chat_member_unique_group_member"),
+        ]
 
     def __str__(self):
         return f"{self.member.name} - {self.group.group_name} ({self.role})"
@@ -72,6 +95,12 @@ class GroupChat(Base):
     file_message = models.URLField(max_length=200, null=True, blank=True)
     deleted_for = models.ManyToManyField(User, related_name="deleted_messages")
 
+    class Meta:
+        indexes = [
+            # message pages are range scans on (group, uid); uid is a uuid7, so this is also time order
+            models.Index(fields=["group", "uid"], name="chat_message_group_uid_idx"),
+        ]
+
     @property
     def filename(self):
         if self.message_type == 'file' and self.file_message:
@@ -0,0 +1,172 @@
+import time
+import asyncio
+import logging
+import weakref
+from collections import Counter, deque
+from chat import fastjson
+
+logger = logging.getLogger(__name__)
+
+COALESCE = "coalesce"
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+POLICIES = (COALESCE, DROP_OLDEST, DISCONNECT)
+
+# close code sent to clients shed by the disconnect policy
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+live_queues = weakref.WeakSet()
+
+
+class OutboundQueue:
+    """
+    Bounded outbound queue of one websocket, drained by its own writer task.
+    A frame with a coalesce key (typing, presence: only the latest state matters) always replaces
+    the queued frame with the same key, whatever the policy.
+    Overflow policy:
+    - drop_oldest: keyed frames are shed first (the oldest one, or the incoming one if none is queued),
+      then the oldest message; the client gets a gap marker naming the groups that lost messages.
+    - coalesce: keyed frames are shed the same way, but a message is never dropped: once the queue
+      is full of messages the socket is closed, the client reconnects and resyncs.
+    - disconnect: the socket is closed as soon as the queue is full.
+    """
+
+    def __init__(self, send, close, maxsize=256, policy=DROP_OLDEST, name=""):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown outbound policy {policy}, expected one of {POLICIES}")
+        self._send = send
+        self._close = close
+        self.maxsize = maxsize
+        self.policy = policy
+        self.name = name
+        self._items = deque()
+        self._keyed = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # group id -> messages dropped since the last gap marker
+        self._gaps = Counter()
+        self._last_warning = 0
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.shed = 0
+        self.high_watermark = 0
+        live_queues.add(self)
+
+    def start(self):
+        self._task = asyncio.create_task(self._drain())
+
+    def depth(self):
+        return len(self._items)
+
+    def put(self, frame, key=None, group=None):
+        if self.closed:
+            return False
+        if key is not None and key in self._keyed:
+            self._keyed[key][1] = frame
+            self.coalesced += 1
+            return True
+        if len(self._items) >= self.maxsize and not self._make_room(key):
+            return False
+
+        entry = [key, frame, group]
+        self._items.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+        depth = len(self._items)
+        self.high_watermark = max(self.high_watermark, depth)
+        if depth >= self.maxsize * 0.8:
+            self._warn_slow(depth)
+        self._wakeup.set()
+        return True
+
+    def _make_room(self, key):
+        # frees a slot for an incoming frame with the given key; False when that frame is not queued
+        if self.policy != DISCONNECT:
+            if self._keyed:
+                # the oldest transient frame goes first, a newer state of it follows anyway
+                self._items.remove(self._keyed.pop(next(iter(self._keyed))))
+                self.shed += 1
+                return True
+            if key is not None:
+                # a transient frame never pushes out a message
+                self.shed += 1
+                return False
+        if self.policy != DROP_OLDEST:
+            logger.warning(f"outbound queue of {self.name} is full, disconnecting slow consumer")
+            self.closed = True
+            asyncio.create_task(self._close(SLOW_CONSUMER_CLOSE_CODE))
+            return False
+        # nothing keyed is queued, so this is a message
+        _, _, group = self._items.popleft()
+        self._gaps[group] += 1
+        self.dropped += 1
+        return True
+
+    def _warn_slow(self, depth):
+        now = time.monotonic()
+        if now - self._last_warning > 10:
+            self._last_warning = now
+            logger.warning(f"slow websocket consumer {self.name}: {depth}/{self.maxsize} frames queued, {self.dropped} dropped")
+
+    async def _drain(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._items:
+                    if self._gaps:
+                        gaps, self._gaps = self._gaps, Counter()
+                        await self._send(fastjson.dumps({
+                            "type": "gap",
+                            "dropped": sum(gaps.values()),
+                            # group id -> messages lost, the client resyncs only those groups
+                            "groups": {str(group): count for group, count in gaps.items() if group is not None},
+                        }))
+                    entry = self._items.popleft()
+                    key, frame, _ = entry
+                    if key is not None and self._keyed.get(key) is entry:
+                        del self._keyed[key]
+                    await self._send(frame)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # client went away while writing, nothing left to deliver to
+            logger.info(f"outbound writer of {self.name} stopped: {e}")
+            self.closed = True
+
+    async def close(self):
+        self.closed = True
+        self._items.clear()
+        self._keyed.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        live_queues.discard(self)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "depth": len(self._items),
+            "high_watermark": self.high_watermark,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "shed": self.shed,
+        }
+
+
+def outbound_stats(slowest=10):
+    """Queue depth of every live socket in this process, deepest first."""
+    queues = sorted((q.stats() for q in list(live_queues)), key=lambda s: s["depth"], reverse=True)
+    return {
+        "connections": len(queues),
+        "queued": sum(s["depth"] for s in queues),
+        "dropped": sum(s["dropped"] for s in queues),
+        "slowest": queues[:slowest],
+    }
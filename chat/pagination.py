@@ -0,0 +1,129 @@
+import base64
+import datetime
+from uuid import UUID
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination over message ids (uuid7, so id order is creation order).
+    - no cursor:          newest page
+    - ?before=<uid>:      older messages, the page right before that message
+    - ?after=<uid>:       newer messages, the page right after that message
+    - ?limit=<n>:         page size, capped by CHAT_MESSAGE_MAX_PAGE_SIZE
+    Every page is an index range scan on (group, uid) of limit + 1 rows, whatever the history size.
+    Results are always oldest first.
+    """
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get("limit", settings.CHAT_MESSAGE_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({"limit": "must be an integer."})
+        return max(1, min(limit, settings.CHAT_MESSAGE_MAX_PAGE_SIZE))
+
+    @staticmethod
+    def get_cursor(request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return UUID(value)
+        except ValueError:
+            raise ValidationError({name: "invalid message id."})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = self.get_limit(request)
+        before = self.get_cursor(request, "before")
+        after = self.get_cursor(request, "after")
+        if before and after:
+            raise ValidationError({"detail": "use either before or after, not both."})
+
+        if after:
+            rows = list(queryset.filter(uid__gt=after).order_by("uid")[:limit + 1])
+            self.has_after = len(rows) > limit
+            # the cursor message itself or anything older the user still sees, one row probe on the index
+            self.has_before = queryset.filter(uid__lte=after).exists()
+            rows = rows[:limit]
+        else:
+            if before:
+                queryset = queryset.filter(uid__lt=before)
+            rows = list(queryset.order_by("-uid")[:limit + 1])
+            self.has_before = len(rows) > limit
+            self.has_after = before is not None
+            rows = rows[:limit][::-1]
+
+        self.page = rows
+        return rows
+
+    @staticmethod
+    def row_uid(row):
+        # MessageAPI pages are .values() dicts
+        return row["uid"] if isinstance(row, dict) else row.uid
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "status": True,
+                "message": "messages fetched.",
+                "data": {
+                    "results": data,
+                    # pass back as ?before= / ?after= to keep scrolling
+                    "before": str(self.row_uid(self.page[0])) if self.page and self.has_before else None,
+                    "after": str(self.row_uid(self.page[-1])) if self.page else None,
+                    "has_before": self.has_before,
+                    "has_after": self.has_after,
+                }
+            }
+        )
+
+
+class InboxCursorPagination(BasePagination):
+    """
+    Groups by last activity, newest first, paged by an opaque ?cursor= over (last_activity_at, uid).
+    Each page is a range scan on the activity index, no OFFSET.
+    """
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get("limit", settings.CHAT_INBOX_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({"limit": "must be an integer."})
+        return max(1, min(limit, settings.CHAT_INBOX_MAX_PAGE_SIZE))
+
+    @staticmethod
+    def encode_cursor(group):
+        raw = f"{group.last_activity_at.isoformat()}|{group.uid}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(value):
+        try:
+            activity, uid = base64.urlsafe_b64decode(value.encode("ascii")).decode("utf-8").split("|")
+            return datetime.datetime.fromisoformat(activity), UUID(uid)
+        except Exception:
+            raise ValidationError({"cursor": "invalid cursor."})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = self.get_limit(request)
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            activity, uid = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(last_activity_at__lt=activity) | Q(last_activity_at=activity, uid__lt=uid))
+        rows = list(queryset.order_by("-last_activity_at", "-uid")[:limit + 1])
+        self.next_cursor = self.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        self.page = rows[:limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "status": True,
+                "message": "inbox fetched.",
+                "data": {"results": data, "next": self.next_cursor}
+            }
+        )
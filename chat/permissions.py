@@ -1,7 +1,24 @@
+from uuid import UUID
 from rest_framework.permissions import BasePermission
+from chat.membership import is_group_member
 
 
 class IsMember(BasePermission):
+    """
+    Requester must be a member of the group: the ?group= of the request, or the group of the object.
+    Both checks are one cached indexed lookup, never a scan of the group's members.
+    """
+
+    def has_permission(self, request, view):
+        group_id = request.GET.get("group")
+        if not group_id:
+            # no group in the request, the object level check decides
+            return True
+        try:
+            group_id = UUID(group_id)
+        except ValueError:
+            return False
+        return is_group_member(group_id, request.user.id)
+
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        return user in obj.group.group_members.all()
+        return is_group_member(obj.group_id, request.user.id)
@@ -0,0 +1,186 @@
+import time
+import asyncio
+import logging
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from channels.layers import get_channel_layer
+from chat import fastjson
+
+logger = logging.getLogger(__name__)
+
+# sorted sets scored with the last heartbeat time, anything older than the ttl counts as offline.
+ONLINE_KEY = "presence:online"
+
+
+def group_key(group_id):
+    return f"presence:group:{group_id}"
+
+
+def sockets_key(user_id):
+    return f"presence:sockets:{user_id}"
+
+
+def last_state_key(user_id):
+    return f"presence:last:{user_id}"
+
+
+# drops the socket and returns 1 if it was the user's last live one (user went offline)
+DISCONNECT_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[3])
+for i = 3, #KEYS do
+    redis.call('ZREM', KEYS[i], ARGV[3])
+end
+return 1
+"""
+
+
+class PresenceService:
+    """
+    Online presence backed by redis sorted sets with heartbeat expiry.
+    - presence:online         user id -> last heartbeat
+    - presence:group:<uid>    user id -> last heartbeat, per group
+    - presence:sockets:<uid>  channel name -> last heartbeat, so a user stays online while any socket lives
+    Lookups are ZSCORE/ZRANGEBYSCORE, no scans.
+    """
+
+    def __init__(self, url, ttl=60, debounce=3.0):
+        self.url = url
+        self.ttl = ttl
+        self.debounce = debounce
+        self._sync_client = None
+        self._async_client = None
+        self._async_loop = None
+        self._pending = {}
+
+    @property
+    def client(self):
+        if self._sync_client is None:
+            self._sync_client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self._sync_client
+
+    @property
+    def aclient(self):
+        # redis.asyncio connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = aioredis.Redis.from_url(self.url, decode_responses=True)
+            self._async_loop = loop
+        return self._async_client
+
+    def _touch(self, pipeline, user_id, channel_name, group_ids, now):
+        pipeline.zadd(sockets_key(user_id), {channel_name: now})
+        pipeline.expire(sockets_key(user_id), self.ttl * 2)
+        pipeline.zadd(ONLINE_KEY, {user_id: now})
+        for group_id in group_ids:
+            pipeline.zadd(group_key(group_id), {user_id: now})
+
+    async def connected(self, user_id, channel_name, group_ids):
+        now = time.time()
+        pipeline = self.aclient.pipeline(transaction=False)
+        pipeline.zscore(ONLINE_KEY, user_id)
+        self._touch(pipeline, user_id, channel_name, group_ids, now)
+        previous = (await pipeline.execute())[0]
+        came_online = previous is None or previous < now - self.ttl
+        if came_online:
+            self.schedule_broadcast(user_id, group_ids)
+        return came_online
+
+    async def heartbeat(self, user_id, channel_name, group_ids):
+        pipeline = self.aclient.pipeline(transaction=False)
+        self._touch(pipeline, user_id, channel_name, group_ids, time.time())
+        await pipeline.execute()
+
+    async def left_groups(self, user_id, group_ids):
+        # a socket stopped following some groups; another socket still in them re-adds the user on its heartbeat
+        pipeline = self.aclient.pipeline(transaction=False)
+        for group_id in group_ids:
+            pipeline.zrem(group_key(group_id), user_id)
+        await pipeline.execute()
+
+    async def disconnected(self, user_id, channel_name, group_ids):
+        keys = [sockets_key(user_id), ONLINE_KEY] + [group_key(group_id) for group_id in group_ids]
+        went_offline = await self.aclient.eval(
+            DISCONNECT_SCRIPT, len(keys), *keys, channel_name, time.time() - self.ttl, user_id
+        )
+        if went_offline:
+            self.schedule_broadcast(user_id, group_ids)
+        return bool(went_offline)
+
+    async def is_online(self, user_id):
+        score = await self.aclient.zscore(ONLINE_KEY, user_id)
+        return score is not None and score >= time.time() - self.ttl
+
+    def online_in_group(self, group_id):
+        """User ids online in the group, O(log n + m). Expired entries are trimmed on the way."""
+        cutoff = time.time() - self.ttl
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zremrangebyscore(group_key(group_id), "-inf", f"({cutoff}")
+        pipeline.zrangebyscore(group_key(group_id), cutoff, "+inf")
+        return [int(user_id) for user_id in pipeline.execute()[1]]
+
+    def online_among(self, user_ids):
+        """Which of the given users (e.g. someone's contacts) are online, one ZMSCORE."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        cutoff = time.time() - self.ttl
+        scores = self.client.zmscore(ONLINE_KEY, user_ids)
+        return [int(user_id) for user_id, score in zip(user_ids, scores) if score is not None and score >= cutoff]
+
+    def online_users(self):
+        """Every user online right now, one ZRANGEBYSCORE."""
+        return [int(user_id) for user_id in self.client.zrangebyscore(ONLINE_KEY, time.time() - self.ttl, "+inf")]
+
+    def schedule_broadcast(self, user_id, group_ids):
+        """
+        Debounce: wait, then push only if the state really changed since the last push.
+        A socket that drops and reconnects within the window produces no event at all.
+        """
+        pending = self._pending.pop(user_id, None)
+        if pending is not None:
+            group_ids = set(group_ids) | pending[1]
+            pending[0].cancel()
+        group_ids = set(group_ids)
+        task = asyncio.create_task(self._broadcast_later(user_id, group_ids))
+        self._pending[user_id] = (task, group_ids)
+
+    async def _broadcast_later(self, user_id, group_ids):
+        try:
+            await asyncio.sleep(self.debounce)
+            online = await self.is_online(user_id)
+            state = "online" if online else "offline"
+            previous = await self.aclient.getset(last_state_key(user_id), state)
+            if previous == state:
+                return
+            await self.aclient.expire(last_state_key(user_id), self.ttl * 10)
+            frame = fastjson.dumps({"type": "presence", "user_id": user_id, "status": state})
+            channel_layer = get_channel_layer()
+            await asyncio.gather(*(
+                channel_layer.group_send(group_id, {
+                    "type": "presence_changed",
+                    "frame": frame,
+                    "coalesce_key": f"presence:{user_id}",
+                })
+                for group_id in group_ids
+            ))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"failed to broadcast presence of user {user_id}: {e}")
+        finally:
+            pending = self._pending.get(user_id)
+            if pending is not None and pending[0] is asyncio.current_task():
+                del self._pending[user_id]
+
+
+presence = PresenceService(
+    settings.CHAT_PRESENCE_REDIS_URL,
+    ttl=settings.CHAT_PRESENCE_TTL,
+    debounce=settings.CHAT_PRESENCE_DEBOUNCE,
+)
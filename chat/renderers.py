@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from chat import fastjson
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer on chat.fastjson. Indented output (?indent / Accept indent=) still goes through DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return fastjson.dumpb(data)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser on chat.fastjson, for UTF-8 bodies (anything else goes through DRF)."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return fastjson.loads(stream.read())
+        except fastjson.DecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -2,5 +2,6 @@ from django.urls import re_path
 from chat import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/chat/$', consumers.ChatConsumer.as_asgi())
+    re_path(r'ws/chat/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/chat/mux/$', consumers.MultiplexChatConsumer.as_asgi()),
 ]
@@ -3,6 +3,10 @@ from chat.models import ChatGroup, Member, JoinRequest, GroupChat, Image
 from accounts.serializers import CNFUserSerializer
 from cryptography.fernet import Fernet
 from django.conf import settings
+from django.utils import timezone
+from chat.crypto import decrypt_many, decrypt_text
+from chat.ids import uuid7_from_datetime
+from chat.utils import latest_visible_messages
 
 fernet = Fernet(settings.FERNET_KEY)
 
@@ -17,7 +21,9 @@ class GroupSerialiazer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatGroup
-        exclude = ['updated_at']
+        # last_* are maintained by the message write path, not by clients
+        exclude = ['updated_at', 'last_activity_at', 'last_message_uid', 'last_message_text',
+                   'last_message_type', 'last_message_sender']
 
     def validate(self, data):
         if data.get('group_name') and not isinstance(data.get('group_name'), str):
@@ -47,6 +53,14 @@ class RequestSerializer(serializers.ModelSerializer):
         exclude = ['updated_at']
 
 
+class ChatListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # decrypt the whole page in one batch (cache + worker pool) before serializing each row
+        items = list(data.all() if hasattr(data, "all") else data)
+        self.child.plaintexts = decrypt_many([(item.uid, item.text_message) for item in items if item.text_message])
+        return super().to_representation(items)
+
+
 class ChatSerializer(serializers.ModelSerializer):
     sent_by = CNFUserSerializer()
     group = ChatGroup()
@@ -55,10 +69,14 @@ class ChatSerializer(serializers.ModelSerializer):
     class Meta:
         model = GroupChat
         fields = ['sent_by', 'group', 'message_type', 'text_message', 'file_message', 'created_at', 'uid']
+        list_serializer_class = ChatListSerializer
 
     def get_text_message(self, obj):
         """Decrypt text_message before sending to frontend."""
         if obj.text_message:
+            plaintexts = getattr(self, "plaintexts", None)
+            if plaintexts is not None and str(obj.uid) in plaintexts:
+                return plaintexts[str(obj.uid)]
             try:
                 return fernet.decrypt(obj.text_message.encode()).decode()
             except Exception:
@@ -73,3 +91,160 @@ class ChatSerializer(serializers.ModelSerializer):
             message.delete()
         else:
             message.deleted_for.add(request.user.id)
+
+
+class SideloadedChatSerializer(ChatSerializer):
+    """Message with just the sender id; the senders are sent once per page in a separate users map."""
+    sent_by = None
+    sender_id = serializers.IntegerField(source="sent_by_id", read_only=True)
+
+    class Meta(ChatSerializer.Meta):
+        fields = ['sender_id', 'message_type', 'text_message', 'file_message', 'created_at', 'uid']
+
+
+class MessageRowSerializer:
+    """
+    Read only fast path of ChatSerializer (and SideloadedChatSerializer with sideload=True) for MessageAPI pages.
+    Builds the same dicts (keys, order, absolute profile_image urls, ISO datetimes with "Z", str uid)
+    straight from .values() rows, without per row field introspection; each sender is built once per page.
+    chat/tests.py holds it to the ModelSerializer output.
+    """
+    message_fields = ("uid", "group_id", "sent_by_id", "message_type", "text_message", "file_message", "created_at")
+    sender_fields = ("sent_by__email", "sent_by__name", "sent_by__profile_image")
+    profile_storage = CNFUserSerializer.Meta.model._meta.get_field("profile_image").storage
+
+    def __init__(self, rows, context=None, sideload=False):
+        self.rows = rows
+        self.context = context or {}
+        self.sideload = sideload
+
+    @classmethod
+    def values_fields(cls, sideload=False):
+        return cls.message_fields if sideload else cls.message_fields + cls.sender_fields
+
+    def sender(self, row, request):
+        image = row["sent_by__profile_image"]
+        if image:
+            image = self.profile_storage.url(image)
+            if request is not None:
+                image = request.build_absolute_uri(image)
+        return {"id": row["sent_by_id"], "email": row["sent_by__email"], "name": row["sent_by__name"], "profile_image": image or None}
+
+    @property
+    def data(self):
+        rows = self.rows
+        request = self.context.get("request")
+        tz = timezone.get_current_timezone()
+        plaintexts = decrypt_many([(row["uid"], row["text_message"]) for row in rows if row["text_message"]])
+        senders = {}
+        results = []
+        for row in rows:
+            uid = str(row["uid"])
+            text = row["text_message"]
+            created_at = row["created_at"]
+            if created_at is not None:
+                created_at = created_at.astimezone(tz).isoformat()
+                if created_at.endswith("+00:00"):
+                    created_at = created_at[:-6] + "Z"
+            if self.sideload:
+                results.append({
+                    "sender_id": row["sent_by_id"],
+                    "message_type": row["message_type"],
+                    "text_message": plaintexts.get(uid, text) if text else None,
+                    "file_message": row["file_message"],
+                    "created_at": created_at,
+                    "uid": uid,
+                })
+                continue
+            sender_id = row["sent_by_id"]
+            sender = None
+            if sender_id is not None:
+                sender = senders.get(sender_id)
+                if sender is None:
+                    sender = senders[sender_id] = self.sender(row, request)
+            results.append({
+                "sent_by": sender,
+                "group": row["group_id"],
+                "message_type": row["message_type"],
+                "text_message": plaintexts.get(uid, text) if text else None,
+                "file_message": row["file_message"],
+                "created_at": created_at,
+                "uid": uid,
+            })
+        return results
+
+
+class InboxListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data)
+        user = self.context["request"].user
+        # the member cleared the chat or deleted this message for themselves: show what they still see,
+        # the fallbacks of the whole page in one query
+        hidden = {
+            item.uid: item.cleared_before
+            for item in items if item.last_message_uid is not None and self.hidden(item, user)
+        }
+        fallbacks = latest_visible_messages(user, hidden)
+        previews = {group_id: fallbacks.get(group_id) for group_id in hidden}
+        self.child.previews = previews
+        # previews of the whole page are decrypted in one batch, sharing the message cache
+        items_text = [(item.last_message_uid, item.last_message_text) for item in items if item.uid not in previews]
+        items_text += [(row.uid, row.text_message) for row in previews.values() if row is not None]
+        self.child.plaintexts = decrypt_many([(uid, text) for uid, text in items_text if uid and text])
+        return super().to_representation(items)
+
+    @staticmethod
+    def hidden(item, user):
+        # item is annotated by InboxAPI with the member's cleared_before and last_message_deleted
+        if item.last_message_deleted:
+            return True
+        return (
+            item.cleared_before is not None
+            and item.last_message_sender_id != user.id
+            and item.last_message_uid < uuid7_from_datetime(item.cleared_before, random=False)
+        )
+
+
+class InboxSerializer(serializers.ModelSerializer):
+    """Chat list entry: the group plus its denormalized last message preview and unread badge."""
+    PREVIEW_LENGTH = 100
+
+    group_profile = ImageSerializer(required=False)
+    last_message = serializers.SerializerMethodField()
+    unread = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChatGroup
+        fields = ['uid', 'group_name', 'group_type', 'group_profile', 'last_activity_at', 'last_message', 'unread']
+        list_serializer_class = InboxListSerializer
+
+    def get_last_message(self, obj):
+        previews = getattr(self, "previews", None) or {}
+        if obj.uid in previews:
+            row = previews[obj.uid]
+            if row is None:
+                return None
+            return self.preview(row.uid, row.message_type, row.text_message, row.sent_by_id, row.sent_by, row.created_at)
+        if obj.last_message_uid is None:
+            return None
+        return self.preview(
+            obj.last_message_uid, obj.last_message_type, obj.last_message_text,
+            obj.last_message_sender_id, obj.last_message_sender, obj.last_activity_at,
+        )
+
+    def preview(self, uid, message_type, token, sender_id, sender, timestamp):
+        text = None
+        if token:
+            plaintexts = getattr(self, "plaintexts", None) or {}
+            text = plaintexts.get(str(uid)) or decrypt_text(token)
+        return {
+            "id": str(uid),
+            "type": message_type,
+            "preview": text[:self.PREVIEW_LENGTH] if text else None,
+            "sender_id": sender_id,
+            "sender_name": sender.name if sender else None,
+            "timestamp": serializers.DateTimeField().to_representation(timestamp),
+        }
+
+    def get_unread(self, obj):
+        return self.context.get("unread", {}).get(str(obj.uid), 0)
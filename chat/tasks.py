@@ -1,8 +1,12 @@
 from chat.models import Member, Image, ChatGroup
-from django.contrib.auth import get_user_model
-import json
+from chat import fastjson
 import logging
 from celery import shared_task
+from chat.utils import notify_membership_changed
+from chat.unread import unread_counters
+from chat.membership import add_members
+from chat.versions import bump_group
+from django.conf import settings
 logger = logging.getLogger(__name__)
 
 
@@ -14,7 +18,6 @@ def finalize_group_creation(group_uid, member_ids=None, image_uid=None):
     - member_ids: list of ints (or empty list)
     - image_uid: str or None
     """
-    User = get_user_model()
     try:
         group = ChatGroup.objects.get(uid=group_uid)
     except ChatGroup.DoesNotExist:
@@ -22,9 +25,11 @@ def finalize_group_creation(group_uid, member_ids=None, image_uid=None):
         return
 
     # create owner as admin if not exists
+    changed_ids = []
     try:
         owner = group.group_owner
         Member.objects.get_or_create(member=owner, group=group, defaults={"role": "admin"})
+        changed_ids.append(owner.pk)
     except Exception as e:
         logger.exception(f"Error ensuring owner member for group {group_uid}: {e}")
 
@@ -34,6 +39,7 @@ def finalize_group_creation(group_uid, member_ids=None, image_uid=None):
             image = Image.objects.get(uid=image_uid)
             group.group_profile = image
             group.save()
+            bump_group(group.uid)
         except Image.DoesNotExist:
             logger.error(f"finalize_group_creation: image {image_uid} not found")
         except Exception as e:
@@ -43,25 +49,68 @@ def finalize_group_creation(group_uid, member_ids=None, image_uid=None):
     if member_ids:
         try:
             if isinstance(member_ids, str):
-                member_ids = json.loads(member_ids)
+                member_ids = fastjson.loads(member_ids)
             if not isinstance(member_ids, list):
                 member_ids = [member_ids]
         except Exception:
             logger.exception("finalize_group_creation: failed to parse member_ids")
 
-        members_to_create = []
-        for mid in member_ids:
-            try:
-                user = User.objects.get(id=mid)
-                # avoid duplicating owner/admin
-                if user == group.group_owner:
-                    continue
-                members_to_create.append(Member(member=user, group=group, role="regular"))
-            except User.DoesNotExist:
-                logger.warning(f"finalize_group_creation: user {mid} not found, skipping")
+        try:
+            # avoid duplicating owner/admin
+            member_ids = [mid for mid in member_ids if str(mid) != str(group.group_owner_id)]
+            added, _, missing = add_members(group, member_ids)
+            changed_ids.extend(added)
+            if missing:
+                logger.warning(f"finalize_group_creation: users {missing} not found, skipping")
+        except Exception as e:
+            logger.exception(f"finalize_group_creation: bulk_create failed: {e}")
+
+    # bulk_create skips signals, so live sockets are told explicitly.
+    if changed_ids:
+        notify_membership_changed(group.uid, changed_ids)
+
+
+@shared_task
+def reconcile_unread_counts(user_ids=None):
+    """
+    Periodic (see CELERY_BEAT_SCHEDULE): recompute the redis unread counters from the read cursors.
+    - user_ids: optional list of ints, only these users are rebuilt; by default online and dirty users
+    """
+    try:
+        rebuilt = unread_counters.reconcile(user_ids)
+        logger.info(f"reconcile_unread_counts: rebuilt unread counters of {rebuilt} users")
+        return rebuilt
+    except Exception as e:
+        logger.exception(f"reconcile_unread_counts failed: {e}")
+
+
+@shared_task(bind=True)
+def import_group_members(self, group_uid, member_ids, role="regular"):
+    """
+    Large member imports (e.g. 50k ids) in chunks of CHAT_MEMBER_IMPORT_CHUNK.
+    Each chunk is one add_members call and one membership notification;
+    progress is reported as the PROGRESS state with done/total/added/not_found.
+    """
+    try:
+        group = ChatGroup.objects.get(uid=group_uid)
+    except ChatGroup.DoesNotExist:
+        logger.error(f"import_group_members: group {group_uid} not found")
+        return {"done": 0, "total": len(member_ids), "added": 0, "not_found": 0, "error": "group not found"}
 
-        if members_to_create:
-            try:
-                Member.objects.bulk_create(members_to_create)
-            except Exception as e:
-                logger.exception(f"finalize_group_creation: bulk_create failed: {e}")
+    total = len(member_ids)
+    chunk_size = settings.CHAT_MEMBER_IMPORT_CHUNK
+    added_count, missing_count = 0, 0
+    for start in range(0, total, chunk_size):
+        added, _, missing = add_members(group, member_ids[start:start + chunk_size], role=role)
+        added_count += len(added)
+        missing_count += len(missing)
+        if added:
+            notify_membership_changed(group.uid, added)
+        self.update_state(state="PROGRESS", meta={
+            "done": min(start + chunk_size, total),
+            "total": total,
+            "added": added_count,
+            "not_found": missing_count,
+        })
+    logger.info(f"import_group_members: added {added_count} of {total} users to group {group_uid}")
+    return {"done": total, "total": total, "added": added_count, "not_found": missing_count}
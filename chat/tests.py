@@ -1,3 +1,222 @@
-from django.test import TestCase
+import asyncio
+from django.test import SimpleTestCase, TestCase
 
 # Create your tests here.
+from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from chat.crypto import encrypt_text
+from chat.models import ChatGroup, GroupChat, Member
+from chat import fastjson
+from chat.outbound import OutboundQueue, COALESCE, DROP_OLDEST, SLOW_CONSUMER_CLOSE_CODE
+from chat.serializers import ChatSerializer, SideloadedChatSerializer, MessageRowSerializer
+from chat.unread import UnreadCounters
+from chat.utils import count_unread_after
+from chat.views import MessageAPI
+
+
+class MessageRowSerializerTests(TestCase):
+    # MessageAPI serves pages through MessageRowSerializer; its output must stay what ChatSerializer produces.
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create(email="alice@example.com", name="Alice", profile_image="profile/alice.png")
+        cls.other = User.objects.create(email="bob@example.com", name="Bob")
+        cls.group = ChatGroup.objects.create(group_owner=cls.user, group_name="serializer-tests")
+        Member.objects.create(group=cls.group, member=cls.user, role="admin")
+        Member.objects.create(group=cls.group, member=cls.other)
+        GroupChat.objects.create(group=cls.group, sent_by=cls.user, message_type="text", text_message=encrypt_text("hello"))
+        GroupChat.objects.create(group=cls.group, sent_by=cls.other, message_type="text", text_message=encrypt_text("hi ünïcödé"))
+        GroupChat.objects.create(group=cls.group, sent_by=cls.user, message_type="file", file_message="https://cdn.example.com/a.pdf")
+        GroupChat.objects.create(group=cls.group, sent_by=None, message_type="text", text_message=encrypt_text("system"))
+        # stored without encryption: both serializers fall back to the raw text
+        GroupChat.objects.create(group=cls.group, sent_by=cls.other, message_type="text", text_message="not a token")
+
+    def setUp(self):
+        self.request = Request(APIRequestFactory().get("/chat/messages/"))
+        self.context = {"request": self.request}
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_matches_chat_serializer(self):
+        rows = GroupChat.objects.filter(group=self.group).select_related("sent_by").order_by("uid")
+        values = GroupChat.objects.filter(group=self.group).order_by("uid").values(*MessageRowSerializer.values_fields())
+        expected = ChatSerializer(rows, many=True, context=self.context).data
+        fast = MessageRowSerializer(list(values), context=self.context).data
+        self.assertEqual(self.render(fast), self.render(expected))
+        self.assertEqual(fast[0]["sent_by"]["profile_image"], "http://testserver/media/profile/alice.png")
+        self.assertTrue(fast[0]["created_at"].endswith("Z"))
+
+    def test_matches_sideloaded_serializer(self):
+        rows = GroupChat.objects.filter(group=self.group).order_by("uid")
+        values = rows.values(*MessageRowSerializer.values_fields(sideload=True))
+        expected = SideloadedChatSerializer(rows, many=True, context=self.context).data
+        fast = MessageRowSerializer(list(values), context=self.context, sideload=True).data
+        self.assertEqual(self.render(fast), self.render(expected))
+
+    def test_message_api_page(self):
+        request = APIRequestFactory().get("/chat/messages/", {"group": str(self.group.uid)})
+        force_authenticate(request, user=self.user)
+        response = MessageAPI.as_view()(request)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        rows = GroupChat.objects.filter(group=self.group).select_related("sent_by").order_by("uid")
+        expected = ChatSerializer(rows, many=True, context={"request": Request(request)}).data
+        self.assertEqual(self.render(response.data["data"]["results"]), self.render(expected))
+
+
+class OutboundQueueTests(SimpleTestCase):
+
+    def drain(self, queue):
+        async def run():
+            queue.start()
+            for _ in range(10):
+                await asyncio.sleep(0)
+            alive = not queue.closed
+            await queue.close()
+            return alive
+        return asyncio.run(run())
+
+    def make_queue(self, policy, maxsize=2):
+        self.sent, self.closed_with = [], []
+
+        async def send(frame):
+            self.sent.append(frame)
+
+        async def close(code):
+            self.closed_with.append(code)
+
+        return OutboundQueue(send, close, maxsize=maxsize, policy=policy, name="test")
+
+    def test_same_key_frames_survive_overflow(self):
+        queue = self.make_queue(DROP_OLDEST)
+        queue.put("typing-1", key="typing:1")
+        # same key: replaced in place, under the default policy too
+        queue.put("typing-2", key="typing:1")
+        self.assertEqual(queue.depth(), 1)
+        queue.put("message-1", group="g1")
+        # overflow sheds the typing frame, and its key mapping with it, before any message
+        queue.put("message-2", group="g1")
+        self.assertEqual(queue._keyed, {})
+        # a transient frame never pushes out a message
+        self.assertFalse(queue.put("typing-3", key="typing:1"))
+        queue.put("typing-4", key="typing:1")
+        self.assertTrue(self.drain(queue))
+        self.assertEqual(self.sent, ["message-1", "message-2"])
+        self.assertEqual(queue._keyed, {})
+
+    def test_drop_oldest_marks_the_gap_per_group(self):
+        queue = self.make_queue(DROP_OLDEST)
+        queue.put("message-1", group="g1")
+        queue.put("message-2", group="g2")
+        queue.put("message-3", group="g2")
+        self.assertTrue(self.drain(queue))
+        self.assertEqual(fastjson.loads(self.sent[0]), {"type": "gap", "dropped": 1, "groups": {"g1": 1}})
+        self.assertEqual(self.sent[1:], ["message-2", "message-3"])
+
+    def test_coalesce_never_drops_a_message(self):
+        queue = self.make_queue(COALESCE)
+
+        async def run():
+            queue.put("presence", key="presence:1")
+            queue.put("message-1", group="g1")
+            queue.put("message-2", group="g1")
+            self.assertEqual(queue.shed, 1)
+            # full of messages: the socket is closed instead of losing one
+            self.assertFalse(queue.put("message-3", group="g1"))
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        self.assertTrue(queue.closed)
+        self.assertEqual(queue.dropped, 0)
+        self.assertEqual(self.closed_with, [SLOW_CONSUMER_CLOSE_CODE])
+
+
+class MessageCursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create(email="carol@example.com", name="Carol")
+        cls.group = ChatGroup.objects.create(group_owner=cls.user, group_name="pagination-tests")
+        Member.objects.create(group=cls.group, member=cls.user, role="admin")
+        cls.uids = [
+            str(GroupChat.objects.create(group=cls.group, sent_by=cls.user, message_type="text", text_message=encrypt_text(f"m{i}")).uid)
+            for i in range(5)
+        ]
+
+    def page(self, **params):
+        request = APIRequestFactory().get("/chat/messages/", {"group": str(self.group.uid), "limit": 2, **params})
+        force_authenticate(request, user=self.user)
+        response = MessageAPI.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        data = response.data["data"]
+        return [row["uid"] for row in data["results"]], data
+
+    def test_newest_page(self):
+        uids, data = self.page()
+        self.assertEqual(uids, self.uids[3:])
+        self.assertTrue(data["has_before"])
+        self.assertFalse(data["has_after"])
+        self.assertEqual(data["before"], self.uids[3])
+
+    def test_before_pages(self):
+        uids, data = self.page(before=self.uids[3])
+        self.assertEqual(uids, self.uids[1:3])
+        self.assertTrue(data["has_before"])
+        self.assertTrue(data["has_after"])
+        uids, data = self.page(before=self.uids[1])
+        self.assertEqual(uids, self.uids[:1])
+        self.assertFalse(data["has_before"])
+        self.assertIsNone(data["before"])
+
+    def test_after_pages(self):
+        uids, data = self.page(after=self.uids[0])
+        self.assertEqual(uids, self.uids[1:3])
+        self.assertTrue(data["has_before"])
+        self.assertTrue(data["has_after"])
+        uids, data = self.page(after=self.uids[2])
+        self.assertEqual(uids, self.uids[3:])
+        self.assertFalse(data["has_after"])
+
+    def test_after_page_without_visible_older_messages(self):
+        # the cursor message was deleted for the user: nothing at or before it is left to page back to
+        GroupChat.objects.get(uid=self.uids[0]).deleted_for.add(self.user)
+        uids, data = self.page(after=self.uids[0])
+        self.assertEqual(uids, self.uids[1:3])
+        self.assertFalse(data["has_before"])
+        self.assertIsNone(data["before"])
+
+
+class UnreadCountTests(TestCase):
+    # reconcile and the read path must agree on what counts as unread
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create(email="dave@example.com", name="Dave")
+        cls.other = User.objects.create(email="erin@example.com", name="Erin")
+        cls.group = ChatGroup.objects.create(group_owner=cls.other, group_name="unread-tests")
+        Member.objects.create(group=cls.group, member=cls.other, role="admin")
+        Member.objects.create(group=cls.group, member=cls.user)
+        cls.messages = [
+            GroupChat.objects.create(group=cls.group, sent_by=cls.other, message_type="text", text_message=encrypt_text(f"m{i}"))
+            for i in range(4)
+        ]
+        GroupChat.objects.create(group=cls.group, sent_by=cls.user, message_type="text", text_message=encrypt_text("own"))
+        cls.messages[1].deleted_for.add(cls.user)
+
+    def reconciled(self):
+        return {member_id: unread for member_id, _, unread in UnreadCounters.count_unread([self.user.id, self.other.id])}
+
+    def test_matches_live_count(self):
+        live = count_unread_after(self.group.uid, self.user, self.messages[0].uid)
+        self.assertEqual(live, 2)
+        Member.objects.filter(member=self.user).update(last_read_message=self.messages[0])
+        self.assertEqual(self.reconciled(), {self.user.id: live, self.other.id: 1})
+
+    def test_without_read_cursor(self):
+        self.assertEqual(self.reconciled()[self.user.id], 3)
@@ -0,0 +1,385 @@
+import asyncio
+import datetime
+import logging
+from collections import Counter
+from uuid import UUID
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DateTimeField, Exists, OuterRef, Q, Subquery, UUIDField, Value
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+# lower bound of the messages of a member who never cleared the group
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# hash field holding the sum of all per-group counters of a user
+TOTAL_FIELD = "_total"
+
+
+def unread_key(user_id):
+    # unread:<user id> -> group id -> unread count, plus the _total field
+    return f"unread:{user_id}"
+
+
+def read_cursor_key(user_id):
+    # unread:read:<user id> -> group id -> id of the newest message the user read
+    return f"unread:read:{user_id}"
+
+
+def fanned_key(group_id):
+    # id of the newest message of the group whose increments the bridge applied
+    return f"unread:fanned:{group_id}"
+
+
+def members_cache_key(group_id):
+    return f"unread:members:{group_id}"
+
+
+# users whose badges may have drifted (deleted messages, membership changes), rebuilt by the next reconcile
+DIRTY_KEY = "unread:dirty"
+
+
+# sets one group counter and moves the total by the difference, so the total never needs a recount
+SET_SCRIPT = """
+local previous = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local value = tonumber(ARGV[2])
+if value == 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], ARGV[1], value)
+end
+return redis.call('HINCRBY', KEYS[1], '_total', value - previous)
+"""
+
+# one group's fan-out, atomic with the move of its watermark.
+# KEYS: the watermark, then the unread hash and the read cursor hash of each member.
+# ARGV: group id, member count n, n member ids, n increments (messages of others), then message id / sender id
+# pairs, oldest first. A member whose cursor is already past some of the messages only gets the newer ones.
+FANOUT_SCRIPT = """
+local group, count = ARGV[1], tonumber(ARGV[2])
+local first = 3 + 2 * count
+for i = 1, count do
+    local member, increment = ARGV[2 + i], tonumber(ARGV[2 + count + i])
+    local cursor = redis.call('HGET', KEYS[2 * i + 1], group)
+    if cursor and cursor >= ARGV[first] then
+        increment = 0
+        for j = first, #ARGV, 2 do
+            if ARGV[j] > cursor and ARGV[j + 1] ~= member then
+                increment = increment + 1
+            end
+        end
+    end
+    if increment > 0 then
+        redis.call('HINCRBY', KEYS[2 * i], group, increment)
+        redis.call('HINCRBY', KEYS[2 * i], '_total', increment)
+    end
+end
+local newest = ARGV[#ARGV - 1]
+local current = redis.call('GET', KEYS[1])
+if not current or newest > current then
+    redis.call('SET', KEYS[1], newest)
+end
+return count
+"""
+
+# moves a read cursor forward and sets the group counter, unless a fan-out moved the watermark since the count
+# was taken (nil then, the caller counts again). A cursor behind the stored one changes nothing.
+# KEYS: unread hash, read cursor hash, group watermark. ARGV: group id, cursor, watermark of the count, count.
+READ_SCRIPT = """
+if (redis.call('GET', KEYS[3]) or '') ~= ARGV[3] then
+    return false
+end
+local current = redis.call('HGET', KEYS[2], ARGV[1])
+if not current or ARGV[2] > current then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    local previous = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+    local value = tonumber(ARGV[4])
+    if value == 0 then
+        redis.call('HDEL', KEYS[1], ARGV[1])
+    else
+        redis.call('HSET', KEYS[1], ARGV[1], value)
+    end
+    redis.call('HINCRBY', KEYS[1], '_total', value - previous)
+end
+return {tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0'), tonumber(redis.call('HGET', KEYS[1], '_total') or '0')}
+"""
+
+
+class UnreadCounters:
+    """
+    Unread badges kept incrementally in redis, one hash per user.
+    - the kafka bridge bumps the counters of every other member when it fans a message out,
+      and moves the group's watermark (newest message counted) in the same script
+    - reading (the websocket read cursor) sets the counter of the group to what is unread after the cursor
+    - reconcile() recomputes the hashes of active and dirty users from the member read cursors, fixing any drift
+    A badge lookup is one HGET (or HGETALL for all groups), never a COUNT over messages.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._sync_client = None
+        self._async_client = None
+        self._async_loop = None
+
+    @property
+    def client(self):
+        if self._sync_client is None:
+            self._sync_client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self._sync_client
+
+    @property
+    def aclient(self):
+        # redis.asyncio connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = aioredis.Redis.from_url(self.url, decode_responses=True)
+            self._async_loop = loop
+        return self._async_client
+
+    @staticmethod
+    def members_of(group_ids):
+        """
+        Member user ids per group, {group id: [user ids]}: one cache round trip and one query for the misses.
+        Cached shortly, notify_membership_changed drops the entry of the group.
+        """
+        from chat.models import Member
+
+        group_ids = [str(group_id) for group_id in group_ids]
+        cached = cache.get_many([members_cache_key(group_id) for group_id in group_ids])
+        members = {group_id: cached[members_cache_key(group_id)] for group_id in group_ids if members_cache_key(group_id) in cached}
+        missing = [group_id for group_id in group_ids if group_id not in members]
+        if missing:
+            loaded = {group_id: [] for group_id in missing}
+            for group_id, member_id in Member.objects.filter(group__uid__in=missing).values_list("group_id", "member_id"):
+                loaded[str(group_id)].append(member_id)
+            cache.set_many(
+                {members_cache_key(group_id): member_ids for group_id, member_ids in loaded.items()},
+                settings.CHAT_UNREAD_MEMBERS_TTL,
+            )
+            members.update(loaded)
+        return members
+
+    async def fanned_out(self, senders):
+        """
+        Called by the bridge with {group id: [(message id, sender id) of every delivered message]}.
+        Each member gets +1 per message of someone else newer than their read cursor; one script per group.
+        """
+        from asgiref.sync import sync_to_async
+
+        members = await sync_to_async(self.members_of)(list(senders))
+        pipeline = self.aclient.pipeline(transaction=False)
+        for group_id, messages in senders.items():
+            messages = sorted((str(message_id), str(sender_id or "")) for message_id, sender_id in messages)
+            sent = Counter(sender_id for _, sender_id in messages)
+            increments = {}
+            for member_id in members.get(str(group_id), []):
+                increment = len(messages) - sent.get(str(member_id), 0)
+                if increment:
+                    increments[str(member_id)] = increment
+            keys = [fanned_key(group_id)]
+            for member_id in increments:
+                keys += [unread_key(member_id), read_cursor_key(member_id)]
+            pipeline.eval(
+                FANOUT_SCRIPT, len(keys), *keys, str(group_id), len(increments), *increments, *increments.values(),
+                *(value for message in messages for value in message),
+            )
+        if senders:
+            await pipeline.execute()
+
+    async def read(self, user, group_id, message_id, attempts=3):
+        """
+        Moves the member's read cursor to message_id and sets the badge to what is unread after it, (count, total).
+        A cursor at or past the group's watermark zeroes the badge without a query. An older one counts the
+        messages between the cursor and the watermark: later ones are still to be counted by the bridge.
+        The count is retried if a fan-out moved the watermark meanwhile; None once attempts run out.
+        """
+        from asgiref.sync import sync_to_async
+        from chat.utils import count_unread_after
+
+        group_id, message_id = str(group_id), str(message_id)
+        pipeline = self.aclient.pipeline(transaction=False)
+        pipeline.hget(read_cursor_key(user.id), group_id)
+        pipeline.hget(unread_key(user.id), group_id)
+        pipeline.hget(unread_key(user.id), TOTAL_FIELD)
+        cursor, count, total = await pipeline.execute()
+        if cursor is not None and message_id <= cursor:
+            # reading backwards: the badge already reflects a newer cursor
+            return int(count or 0), max(int(total or 0), 0)
+
+        keys = (unread_key(user.id), read_cursor_key(user.id), fanned_key(group_id))
+        for _ in range(attempts):
+            fanned = await self.aclient.get(fanned_key(group_id))
+            count = 0
+            # uuid7 strings sort in creation order
+            if fanned is None or message_id < fanned:
+                count = await sync_to_async(count_unread_after)(group_id, user, message_id, fanned)
+            result = await self.aclient.eval(READ_SCRIPT, len(keys), *keys, group_id, message_id, fanned or "", count)
+            if result is not None:
+                return int(result[0]), max(int(result[1]), 0)
+        return None
+
+    async def aset(self, user_id, group_id, value=0):
+        return await self.aclient.eval(SET_SCRIPT, 1, unread_key(user_id), str(group_id), int(value))
+
+    def set(self, user_id, group_id, value=0):
+        return self.client.eval(SET_SCRIPT, 1, unread_key(user_id), str(group_id), int(value))
+
+    def get(self, user_id, group_id):
+        return int(self.client.hget(unread_key(user_id), str(group_id)) or 0)
+
+    def total(self, user_id):
+        return max(int(self.client.hget(unread_key(user_id), TOTAL_FIELD) or 0), 0)
+
+    def all(self, user_id):
+        counts = self.client.hgetall(unread_key(user_id))
+        total = max(int(counts.pop(TOTAL_FIELD, 0)), 0)
+        return {group_id: int(count) for group_id, count in counts.items()}, total
+
+    def mark_dirty(self, user_ids):
+        # best effort, a user missed here is still rebuilt by the reconcile once they are online
+        user_ids = [int(user_id) for user_id in user_ids]
+        if not user_ids:
+            return
+        try:
+            self.client.sadd(DIRTY_KEY, *user_ids)
+        except Exception as e:
+            logger.error(f"failed to mark unread counters of {len(user_ids)} users dirty: {e}")
+
+    def reconcile(self, user_ids=None, chunk_size=500):
+        """
+        Rebuild the hashes from the read cursors: messages of others past last_read_message that the member
+        still sees (the rules of visible_messages). Without user_ids only active users (online now) and dirty
+        ones are rebuilt, everyone else's counters only ever moved by exact increments.
+        Per chunk of users, one query where each membership counts an index range on (group, uid) past its cursor,
+        then one pipeline replacing their hashes.
+        Increments landing while it runs can be lost, the next run or read picks them up.
+        Returns the number of users rewritten.
+        """
+        from chat.presence import presence
+
+        dirty = []
+        if user_ids is None:
+            dirty = list(self.client.smembers(DIRTY_KEY))
+            user_ids = {int(user_id) for user_id in dirty} | set(presence.online_users())
+        user_ids = sorted({int(user_id) for user_id in user_ids})
+
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            # users without any membership left still need their stale hash removed
+            counts = {user_id: {} for user_id in chunk}
+            for member_id, group_id, unread in self.count_unread(chunk):
+                if unread:
+                    counts[member_id][str(group_id)] = unread
+            pipeline = self.client.pipeline(transaction=True)
+            for user_id, groups in counts.items():
+                pipeline.delete(unread_key(user_id))
+                if groups:
+                    pipeline.hset(unread_key(user_id), mapping={**groups, TOTAL_FIELD: sum(groups.values())})
+            pipeline.execute()
+        if dirty:
+            self.client.srem(DIRTY_KEY, *dirty)
+        return len(user_ids)
+
+    @staticmethod
+    def count_unread(user_ids):
+        """(user id, group id, unread) of every membership of the users, in one query."""
+        from chat.models import GroupChat, Member
+
+        member = OuterRef("member_id")
+        unread = (
+            GroupChat.objects
+            .filter(
+                group_id=OuterRef("group_id"),
+                # the range past the read cursor; without one the whole group is unread
+                uid__gt=Coalesce(OuterRef("last_read_message_id"), Value(UUID(int=0), output_field=UUIDField())),
+                created_at__gte=Coalesce(OuterRef("cleared_before"), Value(EPOCH, output_field=DateTimeField())),
+            )
+            .filter(Q(sent_by__isnull=True) | ~Q(sent_by=member))
+            .filter(~Exists(GroupChat.objects.filter(uid=OuterRef("uid"), deleted_for=OuterRef(member))))
+            .order_by()
+            .values("group_id")
+            .annotate(count=Count("uid"))
+            .values("count")
+        )
+        return (
+            Member.objects.filter(member_id__in=user_ids)
+            .annotate(unread=Coalesce(Subquery(unread), 0))
+            .values_list("member_id", "group_id", "unread")
+        )
+
+
+def flush_read_cursors(cursors):
+    """
+    Persist buffered read cursors, {(group id, user id): message id}, with one bulk_update.
+    Cursors only move forward; returns the list of (group id, user id) that advanced.
+    """
+    from chat.models import GroupChat, Member
+
+    if not cursors:
+        return []
+    messages = {
+        str(message.uid): message
+        for message in GroupChat.objects.filter(uid__in=set(cursors.values())).only("uid", "group_id", "created_at")
+    }
+    lookup = Q()
+    for group_id, user_id in cursors:
+        lookup |= Q(group_id=group_id, member_id=user_id)
+    members = Member.objects.filter(lookup).only("uid", "group_id", "member_id", "last_read_at")
+
+    advanced = []
+    for member in members:
+        message = messages.get(str(cursors.get((str(member.group_id), member.member_id))))
+        if message is None or message.group_id != member.group_id:
+            continue
+        if member.last_read_at is not None and member.last_read_at >= message.created_at:
+            continue
+        member.last_read_at = message.created_at
+        member.last_read_message_id = message.uid
+        advanced.append(member)
+    if advanced:
+        Member.objects.bulk_update(advanced, ["last_read_at", "last_read_message"])
+    return [(str(member.group_id), member.member_id) for member in advanced]
+
+
+class ReadCursorBuffer:
+    """
+    Read cursors of every socket in this process, flushed together every CHAT_READ_FLUSH_INTERVAL seconds.
+    A client scrolling through a group sends many read frames, only the newest one per member is written.
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._cursors = {}
+        self._task = None
+
+    def mark(self, group_id, user_id, message_id):
+        """Buffer a cursor; an older one than already buffered is ignored. Returns the buffered cursor."""
+        key = (str(group_id), int(user_id))
+        # uuid7 strings sort in creation order
+        current = self._cursors.get(key)
+        if current is None or str(message_id) > current:
+            self._cursors[key] = current = str(message_id)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+        return current
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self):
+        from asgiref.sync import sync_to_async
+
+        cursors, self._cursors = self._cursors, {}
+        if not cursors:
+            return
+        try:
+            await sync_to_async(flush_read_cursors)(cursors)
+        except Exception as e:
+            logger.error(f"failed to flush {len(cursors)} read cursors: {e}")
+
+
+unread_counters = UnreadCounters(settings.CHAT_UNREAD_REDIS_URL)
+read_cursors = ReadCursorBuffer(interval=settings.CHAT_READ_FLUSH_INTERVAL)
@@ -3,22 +3,32 @@ from chat.views import (
     CreateGroupAPI,
     ListGroupsAPI,
     MemberAPI,
+    MemberImportStatusAPI,
     MessageAPI,
     RefreshApi,
     DeleteMessageApi,
     RequestApiView,
     FileUpload,
-    ClearAllMessages
+    ClearAllMessages,
+    PresenceAPI,
+    UnreadCountsAPI,
+    InboxAPI,
+    ChatMetricsAPI
 )
 
 urlpatterns = [
     path("group/", CreateGroupAPI.as_view()),
     path("list-groups/", ListGroupsAPI.as_view()),
     path("members/", MemberAPI.as_view()),
+    path("members/import/<str:job_id>/", MemberImportStatusAPI.as_view()),
     path("messages/", MessageAPI.as_view()),
     path("custom-refresh/", RefreshApi.as_view()),
     path("message/delete/<uuid:pk>/", DeleteMessageApi.as_view()),
     path("join-requests/", RequestApiView.as_view()),
     path("file-upload/", FileUpload.as_view()),
     path("clear-all-messages/", ClearAllMessages.as_view()),
+    path("presence/", PresenceAPI.as_view()),
+    path("unread/", UnreadCountsAPI.as_view()),
+    path("inbox/", InboxAPI.as_view()),
+    path("metrics/", ChatMetricsAPI.as_view()),
 ]
@@ -1,8 +1,184 @@
+import logging
 from channels.db import database_sync_to_async
-from chat.models import ChatGroup
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from asgiref.sync import async_to_sync
+from django.db.models import Case, OuterRef, Q, Subquery, UUIDField, Value, When
+from chat.models import ChatGroup, GroupChat, Member
+from chat.ids import uuid7_from_datetime
+from chat.unread import members_cache_key, unread_counters
+from chat.membership import is_group_member, forget_membership
+from chat.versions import bump_members, bump_messages
 from uuid import UUID
 
+logger = logging.getLogger(__name__)
+NIL_UUID = UUID(int=0)
+
 
 @database_sync_to_async
 def is_member(group_id, user):
-    return ChatGroup.objects.filter(uid=UUID(group_id), group_members__member__id=user.id).exists()
+    return is_group_member(UUID(str(group_id)), user.id)
+
+
+@database_sync_to_async
+def get_member_group(group_id, user):
+    # resolves the group only if user is a member of it, None otherwise.
+    return ChatGroup.objects.filter(uid=UUID(str(group_id)), group_members__member__id=user.id).first()
+
+
+@database_sync_to_async
+def get_member_groups(user, group_ids=None):
+    # every group of the user in one query, optionally narrowed to the requested ids.
+    queryset = ChatGroup.objects.filter(group_members__member__id=user.id)
+    if group_ids is not None:
+        queryset = queryset.filter(uid__in=[UUID(str(group_id)) for group_id in group_ids])
+    return list(queryset.distinct())
+
+
+def visible_messages(queryset, user, cleared_before=None):
+    """
+    Narrow a group's messages to what the member sees: no messages they deleted for themselves,
+    and after a "clear all" only messages newer than the watermark, plus their own.
+    """
+    queryset = queryset.exclude(deleted_for=user)
+    if cleared_before is not None:
+        # uid is a uuid7, so the watermark is a primary key range
+        queryset = queryset.filter(Q(uid__gte=uuid7_from_datetime(cleared_before, random=False)) | Q(sent_by=user))
+    return queryset
+
+
+def latest_visible_messages(user, cleared):
+    """
+    Newest message the member still sees in each group, {group id: row}, groups given as {group id: cleared_before}.
+    One statement: a top-1 subquery per group on (group, uid), with the rules of visible_messages,
+    feeding a primary key lookup of the rows. Groups with nothing visible are left out.
+    """
+    if not cleared:
+        return {}
+    # the watermark of each group as a uid bound, as visible_messages does for a single group
+    visible_from = Case(
+        *(
+            When(uid=group_id, then=Value(uuid7_from_datetime(cleared_before, random=False) if cleared_before else NIL_UUID))
+            for group_id, cleared_before in cleared.items()
+        ),
+        default=Value(NIL_UUID),
+        output_field=UUIDField(),
+    )
+    newest = (
+        GroupChat.objects.filter(group_id=OuterRef("uid"))
+        .exclude(deleted_for=user)
+        .filter(Q(uid__gte=OuterRef("visible_from")) | Q(sent_by=user))
+        .order_by("-uid")
+        .values("uid")[:1]
+    )
+    groups = ChatGroup.objects.filter(uid__in=list(cleared)).annotate(visible_from=visible_from, newest=Subquery(newest))
+    rows = GroupChat.objects.filter(uid__in=groups.values("newest")).select_related("sent_by")
+    return {row.group_id: row for row in rows}
+
+
+def count_unread_after(group_id, user, message_id, upto=None):
+    """
+    Unread count of a member who has read up to message_id: messages of others they still see after it,
+    up to and including upto when given. A stored read cursor further on wins over message_id.
+    """
+    member = Member.objects.filter(group_id=group_id, member=user).values("last_read_message_id", "cleared_before").first()
+    if member is None:
+        return 0
+    cursor = UUID(str(message_id))
+    if member["last_read_message_id"] is not None and member["last_read_message_id"] > cursor:
+        cursor = member["last_read_message_id"]
+    queryset = GroupChat.objects.filter(group_id=group_id, uid__gt=cursor).exclude(sent_by=user)
+    if upto is not None:
+        queryset = queryset.filter(uid__lte=UUID(str(upto)))
+    return visible_messages(queryset, user, member["cleared_before"]).count()
+
+
+def get_cleared_before(group_id, user):
+    return Member.objects.filter(group__uid=group_id, member=user).values_list("cleared_before", flat=True).first()
+
+
+@database_sync_to_async
+def get_messages_since(group, user, message_id, limit):
+    """
+    Messages of the group after the given one, oldest first, as (rows, complete).
+    complete is False when the cursor is unknown or more than limit messages were missed,
+    the client then has to reload through the paginated api instead.
+    """
+    try:
+        cursor = GroupChat.objects.only("uid").get(uid=UUID(str(message_id)), group=group)
+    except (ValueError, GroupChat.DoesNotExist):
+        return [], False
+    # uuid7 ids are time ordered, the primary key alone is the cursor
+    queryset = GroupChat.objects.filter(group=group, uid__gt=cursor.uid)
+    rows = list(
+        visible_messages(queryset, user, get_cleared_before(group.uid, user))
+        .select_related("sent_by")
+        .order_by("uid")[:limit + 1]
+    )
+    return rows[:limit], len(rows) <= limit
+
+
+def record_group_activity(row):
+    """
+    Copy the newest message onto its group for the inbox, one UPDATE.
+    A late or out of order write never replaces a newer message.
+    """
+    ChatGroup.objects.filter(uid=row.group_id).filter(
+        Q(last_message_uid__isnull=True) | Q(last_message_uid__lt=row.uid)
+    ).update(
+        last_activity_at=row.created_at,
+        last_message_uid=row.uid,
+        last_message_text=row.text_message,
+        last_message_type=row.message_type,
+        last_message_sender_id=row.sent_by_id,
+    )
+
+
+def refresh_group_activity(group_id):
+    # after the newest message was deleted: fall back to the one before it (index scan on group, uid)
+    last = GroupChat.objects.filter(group_id=group_id).order_by("-uid").first()
+    ChatGroup.objects.filter(uid=group_id).update(
+        last_message_uid=last.uid if last else None,
+        last_message_text=last.text_message if last else None,
+        last_message_type=last.message_type if last else None,
+        last_message_sender_id=last.sent_by_id if last else None,
+    )
+
+
+def save_message(row):
+    row.save(force_insert=True)
+    record_group_activity(row)
+    bump_messages(row.group_id)
+
+
+def save_messages(rows):
+    GroupChat.objects.bulk_create(rows)
+    record_group_activity(max(rows, key=lambda row: row.uid))
+    bump_messages(rows[0].group_id)
+
+
+def notify_membership_changed(group_id, user_ids):
+    """
+    Push a membership invalidation to every live socket of the group.
+    Sockets of the affected users re-check their membership once instead of per message.
+    """
+    # the bridge caches member ids for unread counting, permissions cache single memberships
+    cache.delete(members_cache_key(group_id))
+    # badges of a group joined or left are rebuilt by the next reconcile
+    unread_counters.mark_dirty(user_ids)
+    forget_membership(group_id, user_ids)
+    bump_members(group_id, user_ids)
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            str(group_id),
+            {
+                "type": "membership_changed",
+                "group_id": str(group_id),
+                "user_ids": [int(uid) for uid in user_ids],
+            }
+        )
+    except Exception as e:
+        logger.error(f"failed to push membership invalidation for group {group_id}: {e}")
@@ -0,0 +1,96 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+GROUP = "group"
+MEMBERS = "members"
+MESSAGES = "messages"
+
+
+def group_version_key(group_id, scope):
+    return f"version:{scope}:{group_id}"
+
+
+def user_groups_version_key(user_id):
+    return f"version:groups:{user_id}"
+
+
+def get_versions(keys):
+    """
+    Current version of each key, in one cache round trip when they are all known.
+    A missing key (never read, bumped, or evicted) is seeded with the clock in nanoseconds,
+    so a version never comes back to a value a client may still hold.
+    """
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            # add() keeps whatever a concurrent reader seeded first
+            cache.add(key, time.time_ns(), settings.CHAT_VERSION_TTL)
+        found.update(cache.get_many(missing))
+    return [found.get(key) for key in keys]
+
+
+def bump_versions(keys):
+    # dropping the key is the bump: the next read seeds a newer version.
+    # Deferred to commit so no reader pairs the new version with the old rows.
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def bump_group(group_id):
+    """Group metadata changed: its own reads, its member list (members embed the group) and every member's group list."""
+    from chat.models import Member
+
+    member_ids = Member.objects.filter(group_id=group_id).values_list("member_id", flat=True)
+    bump_versions(
+        [group_version_key(group_id, GROUP), group_version_key(group_id, MEMBERS)]
+        + [user_groups_version_key(user_id) for user_id in member_ids]
+    )
+
+
+def bump_members(group_id, user_ids):
+    bump_versions([group_version_key(group_id, MEMBERS)] + [user_groups_version_key(user_id) for user_id in user_ids])
+
+
+def bump_messages(group_id):
+    bump_versions([group_version_key(group_id, MESSAGES)])
+
+
+def bump_user_profile(user_id):
+    # names and avatars are embedded in member lists and message pages of every group of the user
+    from chat.models import Member
+
+    group_ids = Member.objects.filter(member_id=user_id).values_list("group_id", flat=True)
+    bump_versions(
+        [user_groups_version_key(user_id)]
+        + [group_version_key(group_id, scope) for group_id in group_ids for scope in (MEMBERS, MESSAGES)]
+    )
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b(":".join(str(part) for part in parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag):
+    """A 304 for the request if its If-None-Match already holds etag (weak comparison), else None."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return None
+    wanted = etag.removeprefix("W/")
+    if any(tag == "*" or tag.removeprefix("W/") == wanted for tag in parse_etags(header)):
+        return with_etag(Response(status=304), etag)
+    return None
+
+
+def with_etag(response, etag):
+    response["ETag"] = etag
+    # per user answers: no shared caches, and clients revalidate every time
+    response["Cache-Control"] = "private, no-cache"
+    return response
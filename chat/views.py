@@ -1,18 +1,38 @@
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics
-from chat.serializers import GroupSerialiazer, ChatSerializer, MemberSerializer, RequestSerializer
+from chat.serializers import GroupSerialiazer, ChatSerializer, MemberSerializer, RequestSerializer, MessageRowSerializer, InboxSerializer
+from accounts.serializers import CNFUserSerializer
 from chat.models import ChatGroup, Member, GroupChat, JoinRequest, File, Image
 import logging
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from chat.permissions import IsMember
+from chat.membership import is_group_member, is_group_admin, add_members, contacts_among, import_job_key
+from celery.result import AsyncResult
+from django.conf import settings
+from chat.pagination import MessageCursorPagination, InboxCursorPagination
 from uuid import UUID
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import status
-from chat.tasks import finalize_group_creation
-import json
+from rest_framework.exceptions import ValidationError
+from chat.tasks import finalize_group_creation, import_group_members
+from chat.utils import notify_membership_changed, visible_messages, get_cleared_before, refresh_group_activity
+from chat.presence import presence
+from chat.versions import (
+    GROUP, MEMBERS, MESSAGES, get_versions, group_version_key, user_groups_version_key,
+    bump_group, bump_messages, make_etag, not_modified, with_etag,
+)
+from chat.unread import unread_counters
+from chat.kafka_utils import event_producer
+from chat.outbound import outbound_stats
+from chat.dedup import message_dedup
+from chat import fastjson
 from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from django.core.cache import cache
+from chat.ids import uuid7
 logger = logging.getLogger()
 
 
@@ -26,15 +46,24 @@ class CreateGroupAPI(APIView):
         group_id = request.GET.get("group")
         if group_id:
             try:
-                queryset = ChatGroup.objects.get(uid=UUID(group_id), group_members__member__id=request.user.id)
+                # unchanged group: answered from the cache (membership + version), no query
+                group_uid = UUID(group_id)
+                etag = None
+                if is_group_member(group_uid, request.user.id):
+                    etag = make_etag(GROUP, group_uid, *get_versions([group_version_key(group_uid, GROUP)]))
+                    cached = not_modified(request, etag)
+                    if cached:
+                        return cached
+                queryset = ChatGroup.objects.get(uid=group_uid, group_members__member__id=request.user.id)
                 serializer = GroupSerialiazer(queryset)
-                return Response(
+                response = Response(
                     {
                         "status": True,
                         "message": "group fetched",
                         "data": serializer.data
                     }
                 )
+                return with_etag(response, etag) if etag else response
             except ChatGroup.DoesNotExist:
                 logger.error(f"The chat user was looking for does not exists or he is not a member.")
                 return Response(
@@ -71,7 +100,7 @@ class CreateGroupAPI(APIView):
             if raw_member_ids:
                 try:
                     if isinstance(raw_member_ids, str):
-                        member_ids = json.loads(raw_member_ids)
+                        member_ids = fastjson.loads(raw_member_ids)
                     else:
                         member_ids = raw_member_ids
                     # normalize
@@ -168,6 +197,7 @@ class CreateGroupAPI(APIView):
 
             if serializer.is_valid():
                 serializer.save()
+                bump_group(group.uid)
                 return Response(
                     {
                         "status": True,
@@ -197,7 +227,12 @@ class CreateGroupAPI(APIView):
         group_id = UUID(request.GET.get('group'))
         try:
             group = ChatGroup.objects.get(uid=group_id, group_owner=user)
+            # before the delete, while the member rows still say whose group lists change
+            bump_group(group.uid)
+            member_ids = list(Member.objects.filter(group=group).values_list("member_id", flat=True))
             group.delete()
+            # the cascade removed every membership: live sockets drop the group, cached checks are forgotten
+            notify_membership_changed(group_id, member_ids)
             return Response(
                 {
                     "status": True,
@@ -231,16 +266,21 @@ class ListGroupsAPI(generics.ListAPIView):
 
     def get(self, request):
         try:
+            # bumped whenever one of the user's groups or memberships changes
+            etag = make_etag("groups", request.user.id, *get_versions([user_groups_version_key(request.user.id)]))
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
             queryset = self.get_queryset()
             serializer = self.serializer_class(queryset, many=True)
             data = serializer.data
-            return Response(
+            return with_etag(Response(
                 {
                     "status": True,
                     "message": "Info : groups fetched.",
                     "data": data
                 }
-            )
+            ), etag)
         except Exception as e:
             logger.error(f"an unexpected error occurred while listing joined groups: {e}")
             return Response(
@@ -252,6 +292,35 @@ class ListGroupsAPI(generics.ListAPIView):
             )
 
 
+class InboxAPI(generics.ListAPIView):
+    # Chat list: the user's groups by last activity with a last message preview, ?cursor= / ?limit= pages.
+    # last_* fields are denormalized on ChatGroup when messages are written, so a page is one query
+    # (plus one HGETALL for the unread badges), never a MessageAPI call per group.
+    permission_classes = [IsAuthenticated]
+    serializer_class = InboxSerializer
+    pagination_class = InboxCursorPagination
+    queryset = ChatGroup.objects.all()
+
+    def get_queryset(self):
+        user = self.request.user
+        # cleared_before comes from the member row the filter already joins; both feed the preview visibility
+        return self.queryset.filter(group_members__member=user).select_related(
+            "group_profile", "last_message_sender"
+        ).annotate(
+            cleared_before=F("group_members__cleared_before"),
+            last_message_deleted=Exists(GroupChat.objects.filter(uid=OuterRef("last_message_uid"), deleted_for=user)),
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        try:
+            context["unread"], _ = unread_counters.all(self.request.user.id)
+        except Exception as e:
+            logger.error(f"failed to read unread counters for the inbox: {e}")
+            context["unread"] = {}
+        return context
+
+
 class MemberAPI(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -269,11 +338,20 @@ class MemberAPI(APIView):
                 }
             )
         try:
-            group = ChatGroup.objects.get(uid=UUID(group_id), group_members__member=request.user)
+            group_uid = UUID(group_id)
+            etag = None
+            if is_group_member(group_uid, request.user.id):
+                # members embed the group, so both versions count
+                versions = get_versions([group_version_key(group_uid, GROUP), group_version_key(group_uid, MEMBERS)])
+                etag = make_etag(MEMBERS, group_uid, *versions)
+                cached = not_modified(request, etag)
+                if cached:
+                    return cached
+            group = ChatGroup.objects.get(uid=group_uid, group_members__member=request.user)
             members = Member.objects.filter(group=group)
 
             serializer = MemberSerializer(members, many=True)
-            return Response(
+            response = Response(
                 {
                     "status": True,
                     "message": "Members fetched.",
@@ -282,6 +360,7 @@ class MemberAPI(APIView):
                     }
                 }
             )
+            return with_etag(response, etag) if etag else response
         except ChatGroup.DoesNotExist:
             logger.error("error: invalid group id provided.")
             return Response(
@@ -303,11 +382,8 @@ class MemberAPI(APIView):
             )
 
     def post(self, request):
-        # Adds members. Loop over user IDs, one insert per user.
-        # This will blow up for bulk adds. Use bulk_create for performance.
-        # If you’re notifying new members via email/WS, push that to Celery.
-
-        user_model = get_user_model()
+        # Adds members. All ids are resolved and inserted together (chat.membership.add_members);
+        # imports above CHAT_MEMBER_BULK_SYNC_LIMIT ids go to a chunked Celery job instead.
         try:
             data = request.data
             group_id = data.get("groupId")
@@ -337,28 +413,47 @@ class MemberAPI(APIView):
                     }
                 )
 
-            user_ids_list = data.get("memberId")
+            user_ids_list = data.get("memberId") or []
+            if not isinstance(user_ids_list, list):
+                user_ids_list = [user_ids_list]
+            user_ids_list = [int(user_id) for user_id in user_ids_list]
 
-            for user_id in user_ids_list:
-                user = user_model.objects.get(id=user_id)
-                member = Member.objects.create(member=user, group=group)
-                serializer = MemberSerializer(member)
-                logger.info(f"Added member {user.pk} in group.")
-            logger.info("Successfully added members in group.")
+            if len(user_ids_list) > settings.CHAT_MEMBER_BULK_SYNC_LIMIT:
+                job_id = str(uuid7())
+                # recorded before the job starts, MemberImportStatusAPI only answers the group's admins
+                cache.set(
+                    import_job_key(job_id),
+                    {"group": str(group.uid), "requested_by": request.user.id},
+                    settings.CHAT_MEMBER_IMPORT_JOB_TTL,
+                )
+                job = import_group_members.apply_async((str(group.uid), user_ids_list), task_id=job_id)
+                logger.info(f"Queued import of {len(user_ids_list)} members into group {group.uid}.")
+                return Response(
+                    {
+                        "status": True,
+                        "message": "member import started.",
+                        "data": {"job_id": job.id, "total": len(user_ids_list)}
+                    }, status=status.HTTP_202_ACCEPTED
+                )
+
+            added_ids, existing_ids, missing_ids = add_members(group, user_ids_list)
+            if added_ids:
+                notify_membership_changed(group.uid, added_ids)
+            logger.info(f"Added {len(added_ids)} members in group {group.uid}.")
             return Response(
                 {
                     "status": True,
                     "message": "members added to group.",
-                    "data": serializer.data
+                    "data": {"added": added_ids, "already_members": existing_ids, "not_found": missing_ids}
                 }
             )
-        except user_model.DoesNotExist:
+        except ValueError:
             return Response(
                 {
                     "status": False,
-                    "message": "User does not exists.",
+                    "message": "invalid group or member id.",
                     "data": {}
-                }
+                }, status=400
             )
         except Exception as e:
             logger.error(f"An unexpected error occured: {e}")
@@ -369,7 +464,7 @@ class MemberAPI(APIView):
                     "data": {}
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-    
+
     def patch(self, request):
         # Change member role. Single update. Fine inline.
         data = request.data
@@ -385,6 +480,7 @@ class MemberAPI(APIView):
                         member = Member.objects.get(group__uid=UUID(group_id), uid=UUID(member_id))
                         member.role=new_role
                         member.save()
+                        notify_membership_changed(UUID(group_id), [member.member_id])
                         return Response(
                             {
                                 "status": True,
@@ -436,7 +532,9 @@ class MemberAPI(APIView):
                 if is_admin:
                     member = Member.objects.filter(uid=UUID(member_id), group__uid=UUID(group_id))
                     if member.exists():
-                        member[0].delete()
+                        removed = member[0]
+                        removed.delete()
+                        notify_membership_changed(UUID(group_id), [removed.member_id])
                         return Response(
                             {
                                 "status": True,
@@ -479,18 +577,93 @@ class MemberAPI(APIView):
             )
 
 
+class MemberImportStatusAPI(APIView):
+    # Progress of a chunked member import started by MemberAPI.post, for admins of the imported group only.
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            owner = cache.get(import_job_key(job_id))
+            # unknown, expired or another group's job: all look the same to the caller
+            if owner is None or not is_group_admin(UUID(owner["group"]), request.user.id):
+                return Response(
+                    {
+                        "status": False,
+                        "message": "import job not found.",
+                        "data": {}
+                    }, status=status.HTTP_404_NOT_FOUND
+                )
+            job = AsyncResult(str(job_id))
+            progress = job.info if isinstance(job.info, dict) else {}
+            return Response(
+                {
+                    "status": True,
+                    "message": "import status fetched.",
+                    "data": {"job_id": str(job_id), "group": owner["group"], "state": job.state, **progress}
+                }
+            )
+        except Exception as e:
+            logger.error(f"An unexpected error occured while reading member import {job_id}: {e}")
+            return Response(
+                {
+                    "status": False,
+                    "message": "something went wrong.",
+                    "data": {}
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class MessageAPI(generics.ListAPIView):
     # Returns messages for a group, ordered.
     # This is the hot path. Optimize with select_related (sender, group).
-    # Pagination required (don’t return 10k messages).
+    # Keyset pages (?before=<uid> / ?after=<uid> / ?limit=), never the whole history.
+    # ?sideload=users: messages carry only sender_id, each sender is serialized once in data.users.
+    # Pages are .values() rows turned into dicts by MessageRowSerializer; ChatSerializer stays the schema.
     # No Celery here, it’s read-only.
     permission_classes = [IsAuthenticated, IsMember]
     queryset = GroupChat.objects.all()
     serializer_class = ChatSerializer
+    pagination_class = MessageCursorPagination
+
+    def get_group_id(self):
+        try:
+            return UUID(self.request.GET.get("group"))
+        except (TypeError, ValueError):
+            raise ValidationError({"group": "a valid group id is required."})
 
     def get_queryset(self):
-        group_id = UUID(self.request.GET.get("group"))
-        return self.queryset.filter(group__uid=group_id).exclude(deleted_for=self.request.user).order_by("created_at")
+        # membership of ?group= is already checked by IsMember.has_permission
+        group_id = self.get_group_id()
+        user = self.request.user
+        queryset = visible_messages(self.queryset.filter(group__uid=group_id), user, get_cleared_before(group_id, user))
+        # plain .values() rows for MessageRowSerializer; without sideload the sender columns come from the same join
+        fields = MessageRowSerializer.values_fields(sideload=self.request.GET.get("sideload") == "users")
+        # uid is a uuid7, ordering by the primary key is creation order
+        return queryset.order_by("uid").values(*fields)
+
+    def list(self, request, *args, **kwargs):
+        # IsMember already passed from the cache; an unchanged page is a 304 before any query.
+        # Visibility is per user (deleted_for, cleared_before), so the user is part of the tag.
+        group_id = self.get_group_id()
+        etag = make_etag(
+            MESSAGES, group_id, request.user.id, *get_versions([group_version_key(group_id, MESSAGES)]),
+            request.get_full_path(),
+        )
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        sideload = request.GET.get("sideload") == "users"
+        page = self.paginate_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        response = self.get_paginated_response(MessageRowSerializer(page, context=context, sideload=sideload).data)
+        if not sideload:
+            return with_etag(response, etag)
+        # page query + one query for all senders of the page, whatever the page size
+        senders = get_user_model().objects.filter(id__in={row["sent_by_id"] for row in page if row["sent_by_id"]})
+        response.data["data"]["users"] = {
+            str(user["id"]): user for user in CNFUserSerializer(senders, many=True, context=context).data
+        }
+        return with_etag(response, etag)
 
 
 class DeleteMessageApi(generics.DestroyAPIView):
@@ -512,7 +685,14 @@ class DeleteMessageApi(generics.DestroyAPIView):
 
         # If requester is the sender -> allow hard delete for everyone
         if getattr(instance.sent_by, "id", None) == getattr(user, "id", None):
+            message_uid = instance.uid
             instance.delete()
+            bump_messages(instance.group_id)
+            # the inbox preview must not keep showing a deleted message
+            if ChatGroup.objects.filter(uid=instance.group_id, last_message_uid=message_uid).exists():
+                refresh_group_activity(instance.group_id)
+            # members who had it unread keep counting it until their badges are rebuilt
+            unread_counters.mark_dirty(unread_counters.members_of([instance.group_id])[str(instance.group_id)])
             return Response(
                 {"status": True, "message": "message deleted for everyone.", "data": {}},
                 status=status.HTTP_200_OK,
@@ -521,6 +701,8 @@ class DeleteMessageApi(generics.DestroyAPIView):
         # Otherwise soft-delete for requester only (assumes deleted_for is M2M to user)
         try:
             instance.deleted_for.add(user)
+            bump_messages(instance.group_id)
+            unread_counters.mark_dirty([user.id])
             return Response(
                 {"status": True, "message": "message deleted for you.", "data": {}},
                 status=status.HTTP_200_OK,
@@ -546,31 +728,35 @@ class ClearAllMessages(APIView):
             )
 
         try:
-            # ensure the requester is a member of the group
-            group = ChatGroup.objects.get(uid=UUID(group_id), group_members__member=request.user)
+            group_uid = UUID(group_id)
         except ValueError:
             return Response(
                 {"status": False, "message": "invalid group id format.", "data": {}},
                 status=400,
             )
-        except ChatGroup.DoesNotExist:
-            return Response(
-                {"status": False, "message": "group not found or you are not a member.", "data": {}},
-                status=404,
-            )
 
         try:
-            # Soft-delete for the requester: mark messages they did NOT send as deleted_for=request.user
-            msgs_to_mark = GroupChat.objects.filter(group=group).exclude(sent_by=request.user).exclude(deleted_for=request.user)
-            count = msgs_to_mark.count()
-            for m in msgs_to_mark:
-                m.deleted_for.add(request.user)
+            # Soft-delete for the requester: one watermark update instead of a deleted_for row per message.
+            # Messages of others created before it are hidden, the requester's own messages stay.
+            # The update also checks membership: no member row, nothing updated.
+            cleared_before = timezone.now()
+            updated = Member.objects.filter(group__uid=group_uid, member=request.user).update(cleared_before=cleared_before)
+            if not updated:
+                return Response(
+                    {"status": False, "message": "group not found or you are not a member.", "data": {}},
+                    status=404,
+                )
+            bump_messages(group_uid)
+            try:
+                unread_counters.set(request.user.id, group_uid, 0)
+            except Exception as e:
+                logger.error(f"failed to reset unread counter after clearing group {group_id}: {e}")
 
             return Response(
                 {
                     "status": True,
                     "message": "Messages cleared for you.",
-                    "data": {"cleared_count": count},
+                    "data": {"cleared_before": cleared_before.isoformat()},
                 }
             )
         except Exception as e:
@@ -722,6 +908,110 @@ class RequestApiView(APIView):
         )
 
 
+class PresenceAPI(APIView):
+    # Online status from redis sorted sets, never touches message tables.
+    # ?group=<uid> -> members online in the group, ?users=1,2,3 -> which of these contacts are online.
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        group_id = request.GET.get("group")
+        user_ids = request.GET.get("users")
+        try:
+            if group_id:
+                if not is_group_member(UUID(group_id), request.user.id):
+                    return Response(
+                        {
+                            "status": False,
+                            "message": "group not found or you are not a member.",
+                            "data": {}
+                        }, status=404
+                    )
+                return Response(
+                    {
+                        "status": True,
+                        "message": "online members fetched.",
+                        "data": {"group": group_id, "online": presence.online_in_group(str(UUID(group_id)))}
+                    }
+                )
+            if user_ids:
+                ids = [int(user_id) for user_id in user_ids.split(",") if user_id]
+                # only contacts: users sharing a group with the caller, other ids are left out
+                ids = sorted(contacts_among(request.user.id, ids))
+                return Response(
+                    {
+                        "status": True,
+                        "message": "online users fetched.",
+                        "data": {"online": presence.online_among(ids)}
+                    }
+                )
+            return Response(
+                {
+                    "status": False,
+                    "message": "group or users not provided.",
+                    "data": {}
+                }, status=400
+            )
+        except ValueError:
+            return Response(
+                {"status": False, "message": "invalid group or user id.", "data": {}},
+                status=400,
+            )
+        except Exception as e:
+            logger.error(f"An unexpected error occured while reading presence: {e}")
+            return Response(
+                {
+                    "status": False,
+                    "message": "something went wrong.",
+                    "data": {}
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class UnreadCountsAPI(APIView):
+    # Unread badges from the redis counters, O(1) per group and for the total.
+    # ?group=<uid> -> that group only, otherwise every group with unread messages plus the total.
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        group_id = request.GET.get("group")
+        try:
+            if group_id:
+                group_id = str(UUID(group_id))
+                return Response(
+                    {
+                        "status": True,
+                        "message": "unread count fetched.",
+                        "data": {
+                            "group": group_id,
+                            "unread": unread_counters.get(request.user.id, group_id),
+                            "total": unread_counters.total(request.user.id),
+                        }
+                    }
+                )
+            groups, total = unread_counters.all(request.user.id)
+            return Response(
+                {
+                    "status": True,
+                    "message": "unread counts fetched.",
+                    "data": {"groups": groups, "total": total}
+                }
+            )
+        except ValueError:
+            return Response(
+                {"status": False, "message": "invalid group id format.", "data": {}},
+                status=400,
+            )
+        except Exception as e:
+            logger.error(f"An unexpected error occured while reading unread counts: {e}")
+            return Response(
+                {
+                    "status": False,
+                    "message": "something went wrong.",
+                    "data": {}
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class FileUpload(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -758,3 +1048,21 @@ class FileUpload(APIView):
                     "data": {}
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class ChatMetricsAPI(APIView):
+    # Process local realtime metrics for operators (the ASGI worker that serves this request).
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                "status": True,
+                "message": "metrics fetched.",
+                "data": {
+                    "producer": event_producer.stats(),
+                    "outbound": outbound_stats(),
+                    "dedup": message_dedup.stats(),
+                }
+            }
+        )
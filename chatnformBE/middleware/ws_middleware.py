@@ -37,6 +37,10 @@ class TokenAuthMiddleware:
             # parse_qs returns a list for each key, so we take the first element
             temp_token = query_params.get('token', [None])[0]
             group_id = query_params.get('group', [None])[0]
+            # multiplexed sockets may narrow their subscriptions with ?groups=a,b
+            group_ids = query_params.get('groups', [None])[0]
+            # reconnecting sockets resume after the last message id they saw
+            since = query_params.get('since', [None])[0]
 
             # Set the user and group_id in the scope for the consumer to use
             if temp_token:
@@ -45,11 +49,15 @@ class TokenAuthMiddleware:
                 scope['user'] = AnonymousUser()
                 
             scope['group_id'] = group_id
-            
+            scope['group_ids'] = [g for g in group_ids.split(',') if g] if group_ids else None
+            scope['since'] = since
+
         except Exception as e:
             # Handle any decoding or parsing errors
             print(f"Error in TokenAuthMiddleware: {e}")
             scope['user'] = AnonymousUser()
             scope['group_id'] = None
+            scope['group_ids'] = None
+            scope['since'] = None
 
         return await self.app(scope, receive, send)
\ No newline at end of file
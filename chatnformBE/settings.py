@@ -168,6 +168,71 @@ CHANNEL_LAYERS = {
 }
 KAFKA_BROKER_URL = 'localhost:9092'
 KAFKA_TOPIC = 'messages'
+KAFKA_CONSUMER_GROUP = 'django_websocket_consumer_group'
+# wire format of realtime events: 'json', 'msgpack' or 'avro'. Upgraded bridges decode all of them;
+# opt into msgpack/avro only once every run_kafka_consumer in the deployment understands the codec header.
+KAFKA_EVENT_CODEC = 'json'
+# extra librdkafka options merged over the chat producer defaults (linger, lz4, idempotence)
+KAFKA_PRODUCER_CONFIG = {}
+# seconds between producer delivery/latency stats log lines (only while events are produced)
+KAFKA_PRODUCER_STATS_INTERVAL = 60
+
+# websocket message dedup window (seconds) and in-process LRU size
+CHAT_DEDUP_TTL = 60
+CHAT_DEDUP_LOCAL_SIZE = 10000
+
+# per-socket outbound queue: max queued frames and overflow policy ('drop_oldest', 'coalesce' or 'disconnect');
+# typing/presence frames of the same sender are always replaced in place, and shed before any message
+CHAT_OUTBOUND_QUEUE_SIZE = 256
+CHAT_OUTBOUND_POLICY = 'drop_oldest'
+
+# max messages a client may send in one batched websocket frame
+CHAT_MAX_BATCH_MESSAGES = 100
+
+# presence: sockets must heartbeat within the ttl (seconds) to stay online,
+# status pushes wait for the debounce window so flapping connections stay quiet
+CHAT_PRESENCE_REDIS_URL = "redis://127.0.0.1:6379/0"
+CHAT_PRESENCE_TTL = 60
+CHAT_PRESENCE_DEBOUNCE = 3
+
+# minimum seconds between repeated ephemeral signals (typing...) of one socket
+CHAT_EPHEMERAL_MIN_INTERVAL = 2
+
+# unread badges: redis hashes bumped at fan-out, read cursors are flushed to the db every interval (seconds)
+CHAT_UNREAD_REDIS_URL = CHAT_PRESENCE_REDIS_URL
+CHAT_UNREAD_MEMBERS_TTL = 30
+CHAT_READ_FLUSH_INTERVAL = 2
+
+# reconnect replay: max missed messages streamed before asking the client to resync,
+# and how long (seconds) replayed ids are kept to drop their queued live copies
+CHAT_RESUME_MAX_MESSAGES = 500
+CHAT_RESUME_DEDUP_WINDOW = 30
+
+# message history pages: default and max messages per page
+CHAT_MESSAGE_PAGE_SIZE = 50
+CHAT_MESSAGE_MAX_PAGE_SIZE = 200
+
+# message decryption: in-memory LRU of plaintext by message uid (0 disables it),
+# worker threads for a page and the page size from which the pool is used
+CHAT_DECRYPT_CACHE_SIZE = 10000
+CHAT_DECRYPT_WORKERS = min(4, os.cpu_count() or 1)
+CHAT_DECRYPT_PARALLEL_MIN = 64
+
+# seconds a membership check result stays cached (dropped early on membership changes)
+CHAT_MEMBERSHIP_CACHE_TTL = 30
+
+# inbox (chat list) pages: default and max groups per page
+CHAT_INBOX_PAGE_SIZE = 30
+CHAT_INBOX_MAX_PAGE_SIZE = 100
+
+# member additions above this many ids run as a celery job, inserting CHAT_MEMBER_IMPORT_CHUNK ids per step
+CHAT_MEMBER_BULK_SYNC_LIMIT = 1000
+CHAT_MEMBER_IMPORT_CHUNK = 2000
+# seconds the group and requester of an import job are kept for its status endpoint
+CHAT_MEMBER_IMPORT_JOB_TTL = 24 * 60 * 60
+
+# per group read versions behind the ETags of group, member and message reads; an expired one only costs clients a full refetch
+CHAT_VERSION_TTL = 60 * 60 * 24
 
 # SMTP configration
 
@@ -202,7 +267,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'accounts.authentication.HttpOnlyJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    )
+    ),
+    # orjson backed JSON in and out (chat.fastjson), DRF's own classes for everything else
+    'DEFAULT_RENDERER_CLASSES': (
+        'chat.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'chat.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -275,3 +350,10 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = "UTC"
+CELERY_BEAT_SCHEDULE = {
+    # rebuilds the redis unread counters of online and dirty users from the member read cursors
+    "reconcile-unread-counts": {
+        "task": "chat.tasks.reconcile_unread_counts",
+        "schedule": 60 * 60,
+    },
+}